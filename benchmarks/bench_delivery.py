@@ -0,0 +1,181 @@
+# Throughput benchmark of Scheduler.process_repost + the Forum cog against a fake Discord.
+#
+#   uv run python -m benchmarks.bench_delivery --posts 2000 --forums 10 --interval 0
+#
+# Simulates a large backfill across many forums, then an update wave, and reports posts
+# per second, delivery latency percentiles and rate-limit retries. No bot token is used.
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_wp import CATEGORIES, Corpus, FakeWordPress
+from benchmarks.fake_discord import FakeDiscordAPI, FakeDelivery
+from benchmarks.bench_pipeline import percentile
+
+log = logging.getLogger("benchmarks.delivery")
+
+def setup_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Offline benchmark of Discord delivery")
+    parser.add_argument("--posts", type=int, default=500, help="Number of synthetic posts")
+    parser.add_argument("--forums", type=int, default=5, help="Number of fake forums")
+    parser.add_argument("--updates", type=float, default=0.1, help="Share of posts edited after the backfill")
+    parser.add_argument("--images", action="store_true", help="Serve and upload images from a fake WordPress")
+    parser.add_argument("--posters", action="store_true", help="With --images, serve real A4 PNG posters (needs Pillow)")
+    parser.add_argument("--batch-size", type=int, default=50, help="Scheduler REPOST_BATCH_SIZE")
+    parser.add_argument("--interval", type=float, default=0.0, help="Scheduler REPOST_INTERVAL_SECONDS")
+    parser.add_argument("--latency-ms", type=float, default=80, help="Mean Discord API latency")
+    parser.add_argument("--jitter-ms", type=float, default=40, help="Discord API latency jitter")
+    parser.add_argument("--bucket-capacity", type=int, default=5, help="Requests per route bucket per window")
+    parser.add_argument("--bucket-window", type=float, default=5.0, help="Route bucket window in seconds")
+    parser.add_argument("--global-capacity", type=int, default=50, help="Global requests per second")
+    parser.add_argument("--random-429", type=float, default=0.01, help="Probability of an injected 429")
+    parser.add_argument("--seed", type=int, default=42, help="Corpus and fake API random seed")
+    parser.add_argument("--json", type=str, default=None, help="Also write the results to this JSON file")
+    return parser
+
+class FakeBot:
+    def __init__(self):
+        self.cogs = {}
+
+    def get_cog(self, name: str):
+        return self.cogs.get(name)
+
+async def drain(scheduler, conn) -> int:
+    rounds = 0
+    while True:
+        pending = conn.execute("SELECT COUNT(*) FROM repost").fetchone()[0]
+        if not pending:
+            return rounds
+        await scheduler.process_repost()
+        rounds += 1
+        if conn.execute("SELECT COUNT(*) FROM repost").fetchone()[0] >= pending:
+            log.warning(f"No progress draining repost ({pending} pending), stopping.")
+            return rounds
+
+async def run_phase(name: str, results: dict, scheduler, forum_cog, conn) -> None:
+    forum_cog.latencies = []
+    start = time.perf_counter()
+    rounds = await drain(scheduler, conn)
+    wall = time.perf_counter() - start
+    done = len(forum_cog.latencies)
+
+    results[f"{name}.deliveries"] = done
+    results[f"{name}.rounds"] = rounds
+    results[f"{name}.wall_s"] = wall
+    results[f"{name}.posts_per_s"] = done / wall if wall else 0.0
+    results[f"{name}.latency_p50_ms"] = percentile(forum_cog.latencies, 0.50) * 1000
+    results[f"{name}.latency_p95_ms"] = percentile(forum_cog.latencies, 0.95) * 1000
+    results[f"{name}.latency_p99_ms"] = percentile(forum_cog.latencies, 0.99) * 1000
+    log.info(f"{name}: {done} deliveries in {wall:.2f}s")
+
+async def run(args) -> dict:
+    corpus = Corpus(posts=args.posts, seed=args.seed, image_ratio=0.3 if args.images else 0.0, posters=args.posters)
+    tmp_dir = tempfile.mkdtemp(prefix="news-bench-")
+    results: dict = {"posts": args.posts, "forums": args.forums}
+
+    site = FakeWordPress(corpus).start() if args.images else None
+    try:
+        os.environ["NEWS_DB_PATH"] = os.path.join(tmp_dir, "data.db")
+        if site:
+            os.environ["NEWS_BASE_URL"] = site.base_url
+
+        import services.scrape_web as sw
+        import services.news_processer as np
+        import utils.db_util as db
+        from cogs.forum import Forum
+        from cogs.scheduler import Scheduler
+
+        class TimedForum(Forum):
+            latencies: list[float] = []
+
+            async def create_post(self, *a, **kw):
+                start = time.perf_counter()
+                try:
+                    return await super().create_post(*a, **kw)
+                finally:
+                    self.latencies.append(time.perf_counter() - start)
+
+            async def update_post(self, *a, **kw):
+                start = time.perf_counter()
+                try:
+                    return await super().update_post(*a, **kw)
+                finally:
+                    self.latencies.append(time.perf_counter() - start)
+
+        db.init_db()
+        api = FakeDiscordAPI(
+            latency=args.latency_ms / 1000,
+            jitter=args.jitter_ms / 1000,
+            bucket_capacity=args.bucket_capacity,
+            bucket_window=args.bucket_window,
+            global_capacity=args.global_capacity,
+            random_429=args.random_429,
+            seed=args.seed,
+        )
+        delivery = FakeDelivery(api)
+        bot = FakeBot()
+        forum_cog = TimedForum(bot, delivery=delivery)
+        scheduler = Scheduler(bot)
+        scheduler.repost_batch_size = args.batch_size
+        scheduler.repost_interval = args.interval
+        bot.cogs = {"Forum": forum_cog, "Scheduler": scheduler}
+
+        conn = db.connect()
+        for i in range(args.forums):
+            delivery.add_forum(1000 + i)
+            conn.execute("INSERT OR IGNORE INTO registered_forum (channel_id) VALUES (?)", (1000 + i,))
+        conn.commit()
+
+        # 1) Backfill: every post to every forum
+        base_url = site.base_url if site else "http://127.0.0.1"
+        cat_cache = {cid: name for cid, name in CATEGORIES.values()}
+        items = [sw.parse_post(corpus.post(i, base_url), cat_cache) for i in range(1, args.posts + 1)]
+        np.store_news([dict(item) for item in items])
+        await run_phase("backfill", results, scheduler, forum_cog, conn)
+
+        # 2) Update wave: edit a share of the posts
+        edited = items[:int(len(items) * args.updates)]
+        for item in edited:
+            item["content"] += "\n（本公告內容已更新）"
+        np.store_news([dict(item) for item in edited])
+        await run_phase("update", results, scheduler, forum_cog, conn)
+        conn.close()
+
+        results["api.rate_limited"] = api.stats.rate_limited
+        results["api.retry_wait_s"] = api.stats.retry_wait
+        results["api.uploaded_files"] = api.stats.uploaded_files
+        results["api.uploaded_bytes"] = api.stats.uploaded_bytes
+        for route, latencies in sorted(api.stats.latencies.items()):
+            results[f"api.{route}.calls"] = api.stats.calls[route]
+            results[f"api.{route}.mean_ms"] = statistics.fmean(latencies) * 1000
+            results[f"api.{route}.p95_ms"] = percentile(latencies, 0.95) * 1000
+    finally:
+        if site:
+            site.stop()
+
+    return results
+
+def main():
+    parser = setup_arg_parser()
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s | %(levelname)s | %(name)s | %(message)s")
+    log.setLevel(logging.INFO)
+
+    results = asyncio.run(run(args))
+
+    width = max(len(k) for k in results)
+    for key, value in results.items():
+        print(f"{key:<{width}}  {value:.4f}" if isinstance(value, float) else f"{key:<{width}}  {value}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    sys.exit(main())
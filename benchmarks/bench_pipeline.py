@@ -0,0 +1,124 @@
+# Offline end-to-end benchmark of the scrape -> DB -> repost batch pipeline.
+#
+#   uv run python -m benchmarks.bench_pipeline --posts 10000 --forums 5
+#
+# Runs against benchmarks.fake_wp and a temporary database, never the real site.
+import argparse
+import copy
+import json
+import logging
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_wp import Corpus, FakeWordPress
+
+log = logging.getLogger("benchmarks.pipeline")
+
+def setup_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Offline benchmark of the news pipeline")
+    parser.add_argument("--posts", type=int, default=1000, help="Number of synthetic posts (1k to 100k)")
+    parser.add_argument("--forums", type=int, default=3, help="Registered forums to enqueue reposts for")
+    parser.add_argument("--seed", type=int, default=42, help="Corpus random seed")
+    parser.add_argument("--image-ratio", type=float, default=0.3, help="Share of posts with images")
+    parser.add_argument("--max-categories", type=int, default=3, help="Categories per post (overlap)")
+    parser.add_argument("--batches", type=int, default=200, help="Max repost batches to assemble")
+    parser.add_argument("--json", type=str, default=None, help="Also write the results to this JSON file")
+    return parser
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+def timed(results: dict, name: str, func, *args):
+    start = time.perf_counter()
+    out = func(*args)
+    results[name] = time.perf_counter() - start
+    log.info(f"{name}: {results[name]:.3f}s")
+    return out
+
+def run(args) -> dict:
+    corpus = Corpus(
+        posts=args.posts,
+        seed=args.seed,
+        image_ratio=args.image_ratio,
+        max_categories=args.max_categories,
+    )
+    tmp_dir = tempfile.mkdtemp(prefix="news-bench-")
+    results: dict = {"posts": args.posts, "forums": args.forums}
+
+    with FakeWordPress(corpus) as site:
+        # config reads these at import time
+        os.environ["NEWS_BASE_URL"] = site.base_url
+        os.environ["NEWS_DB_PATH"] = os.path.join(tmp_dir, "data.db")
+
+        import services.scrape_web as sw
+        import services.news_processer as np
+        import services.repost_queue as rq
+        import utils.db_util as db
+
+        db.init_db()
+        with db.connect() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO registered_forum (channel_id) VALUES (?)",
+                [(1000 + i,) for i in range(args.forums)],
+            )
+
+        # 1) Scrape
+        items = timed(results, "scrape_web.main", sw.main) or []
+        results["scraped_items"] = len(items)
+
+        # 2) Ingest: cold (all CREATE), warm (all NO_CHANGE), full update_news cycle
+        timed(results, "store_news.cold", np.store_news, copy.deepcopy(items))
+        timed(results, "store_news.warm", np.store_news, copy.deepcopy(items))
+        timed(results, "update_news.warm", np.update_news)
+
+        # 3) Scheduler batch assembly, draining repost without Discord
+        batch_times = []
+        with db.connect() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            results["repost_rows"] = cursor.execute("SELECT COUNT(*) FROM repost").fetchone()[0]
+            for _ in range(args.batches):
+                start = time.perf_counter()
+                tasks = rq.fetch_batch(cursor, limit=50)
+                batch_times.append(time.perf_counter() - start)
+                if not tasks:
+                    break
+                cursor.executemany(
+                    "DELETE FROM repost WHERE forum_channel_id = ? AND post_id = ?",
+                    [(t["forum_channel_id"], t["post_id"]) for t in tasks],
+                )
+                conn.commit()
+
+        results["batch_assembly.count"] = len(batch_times)
+        results["batch_assembly.mean_ms"] = statistics.fmean(batch_times) * 1000 if batch_times else 0.0
+        results["batch_assembly.p50_ms"] = percentile(batch_times, 0.50) * 1000
+        results["batch_assembly.p95_ms"] = percentile(batch_times, 0.95) * 1000
+        results["db_size_bytes"] = os.path.getsize(os.environ["NEWS_DB_PATH"])
+
+    return results
+
+def main():
+    parser = setup_arg_parser()
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s | %(levelname)s | %(name)s | %(message)s")
+    log.setLevel(logging.INFO)
+
+    results = run(args)
+
+    width = max(len(k) for k in results)
+    for key, value in results.items():
+        print(f"{key:<{width}}  {value:.4f}" if isinstance(value, float) else f"{key:<{width}}  {value}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+# Local stand-in for the Discord objects the Forum cog delivers to.
+# FakeDelivery implements services.delivery.DeliveryBackend; its forums and threads mimic
+# ForumChannel.create_thread / create_tag / edit, Thread.send / fetch_message and
+# Message.edit with simulated latency, per-route rate-limit buckets and injected 429s.
+# Like discord.py, a 429 is never surfaced to the caller: the request sleeps for
+# retry_after and is retried, which is counted in the stats.
+import asyncio
+import itertools
+import random
+
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+
+@dataclass
+class FakeStats:
+    calls: dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    latencies: dict[str, list[float]] = field(default_factory=lambda: defaultdict(list))
+    rate_limited: int = 0
+    retry_wait: float = 0.0
+    uploaded_files: int = 0
+    uploaded_bytes: int = 0
+
+class FakeDiscordAPI:
+    def __init__(
+        self,
+        latency: float = 0.08,
+        jitter: float = 0.04,
+        bucket_capacity: int = 5,
+        bucket_window: float = 5.0,
+        global_capacity: int = 50,
+        random_429: float = 0.0,
+        seed: int = 42,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.bucket_capacity = bucket_capacity
+        self.bucket_window = bucket_window
+        self.global_capacity = global_capacity
+        self.random_429 = random_429
+        self.rng = random.Random(seed)
+        self.stats = FakeStats()
+        self.channels: dict[int, object] = {}
+        self._ids = itertools.count(10**17)
+        self._buckets: dict[str, deque[float]] = defaultdict(deque)
+
+    def next_id(self) -> int:
+        return next(self._ids)
+
+    def _retry_after(self, bucket: str, capacity: int, window: float, now: float) -> float:
+        hits = self._buckets[bucket]
+        while hits and hits[0] <= now - window:
+            hits.popleft()
+        if len(hits) >= capacity:
+            return hits[0] + window - now
+        return 0.0
+
+    async def request(self, route: str, bucket: str, files=None) -> None:
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        while True:
+            now = loop.time()
+            retry_after = max(
+                self._retry_after(f"{route}:{bucket}", self.bucket_capacity, self.bucket_window, now),
+                self._retry_after("global", self.global_capacity, 1.0, now),
+            )
+            if retry_after == 0.0 and self.rng.random() < self.random_429:
+                retry_after = self.rng.uniform(0.5, 2.0)
+            if retry_after == 0.0:
+                break
+            self.stats.rate_limited += 1
+            self.stats.retry_wait += retry_after
+            await asyncio.sleep(retry_after)
+
+        self._buckets[f"{route}:{bucket}"].append(now)
+        self._buckets["global"].append(now)
+        for f in files or []:
+            f.fp.seek(0, 2)
+            self.stats.uploaded_files += 1
+            self.stats.uploaded_bytes += f.fp.tell()
+        await asyncio.sleep(max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter)))
+
+        self.stats.calls[route] += 1
+        self.stats.latencies[route].append(loop.time() - start)
+
+@dataclass
+class FakeTag:
+    name: str
+    moderated: bool = False
+    id: int = 0
+
+class FakeMessage:
+    def __init__(self, api: FakeDiscordAPI, message_id: int, content: str, files=None):
+        self.api = api
+        self.id = message_id
+        self.content = content
+        self.attachments = [SimpleNamespace(filename=f.filename) for f in files or []]
+
+    async def edit(self, *, content=None, attachments=None, **kwargs):
+        await self.api.request("edit_message", f"channel:{self.id}", attachments)
+        if content is not None:
+            self.content = content
+        if attachments is not None:
+            self.attachments = [SimpleNamespace(filename=f.filename) for f in attachments]
+        return self
+
+class FakeThread:
+    def __init__(self, api: FakeDiscordAPI, thread_id: int, name: str, parent: "FakeForum"):
+        self.api = api
+        self.id = thread_id
+        self.name = name
+        self.parent = parent
+        self.starter_message: FakeMessage | None = None
+        self.messages: dict[int, FakeMessage] = {}
+
+    async def fetch_message(self, message_id: int) -> FakeMessage:
+        await self.api.request("fetch_message", f"channel:{self.id}")
+        return self.messages[message_id]
+
+    async def send(self, content=None, *, files=None, **kwargs) -> FakeMessage:
+        await self.api.request("send_message", f"channel:{self.id}", files)
+        message = FakeMessage(self.api, self.api.next_id(), content or "", files)
+        self.messages[message.id] = message
+        return message
+
+class FakeForum:
+    def __init__(self, api: FakeDiscordAPI, forum_id: int, name: str):
+        self.api = api
+        self.id = forum_id
+        self.name = name
+        self.available_tags: list[FakeTag] = []
+
+    async def create_tag(self, *, name: str, moderated: bool = False, **kwargs) -> FakeTag:
+        await self.api.request("create_tag", f"channel:{self.id}")
+        tag = FakeTag(name=name, moderated=moderated, id=self.api.next_id())
+        self.available_tags.append(tag)
+        return tag
+
+    async def edit(self, *, available_tags=None, **kwargs) -> "FakeForum":
+        await self.api.request("edit_channel", f"channel:{self.id}")
+        if available_tags is not None:
+            self.available_tags = [FakeTag(name=t.name, moderated=t.moderated, id=t.id or self.api.next_id()) for t in available_tags]
+        return self
+
+    async def create_thread(self, *, name: str, content: str, applied_tags=None, files=None, **kwargs):
+        await self.api.request("create_thread", f"channel:{self.id}", files)
+        thread = FakeThread(self.api, self.api.next_id(), name, self)
+        starter = FakeMessage(self.api, thread.id, content, files)
+        thread.starter_message = starter
+        thread.messages[starter.id] = starter
+        self.api.channels[thread.id] = thread
+        return SimpleNamespace(thread=thread, message=starter)
+
+class FakeDelivery:
+    def __init__(self, api: FakeDiscordAPI):
+        self.api = api
+
+    def add_forum(self, forum_id: int, name: str | None = None) -> FakeForum:
+        forum = FakeForum(self.api, forum_id, name or f"forum-{forum_id}")
+        self.api.channels[forum_id] = forum
+        return forum
+
+    def get_channel(self, channel_id: int):
+        return self.api.channels.get(channel_id)
+
+    def get_forum(self, forum_id: int) -> FakeForum | None:
+        channel = self.api.channels.get(forum_id)
+        return channel if isinstance(channel, FakeForum) else None
+
+    async def get_thread(self, thread_id: int) -> FakeThread | None:
+        channel = self.api.channels.get(thread_id)
+        return channel if isinstance(channel, FakeThread) else None
@@ -0,0 +1,193 @@
+# Local stand-in for the department's WordPress REST API.
+# Serves a deterministic synthetic corpus on the paths the scraper uses: category pages
+# (HEAD with a Link header), /wp-json/wp/v2/posts, /wp-json/wp/v2/categories/<id> and
+# /wp-content/uploads/... media. Posts are generated from their id on demand, so 100k-post
+# corpora are not held in memory.
+import asyncio
+import json
+import math
+import random
+import threading
+
+from dataclasses import dataclass
+from aiohttp import web
+
+# slug -> (category id, name), same slugs as config.CATEGORY_URLS
+CATEGORIES = {
+    "competition": (11, "競賽"),
+    "announcement": (12, "公告"),
+    "seminar": (13, "演講"),
+    "enrollment": (14, "招生"),
+    "honor-roll": (15, "榮譽榜"),
+    "scholarship": (16, "獎學金"),
+    "intern": (17, "實習"),
+    "recruitment": (18, "徵才"),
+    "1": (1, "最新消息"),
+}
+
+CJK_WORDS = [
+    "資訊工程", "學系", "公告", "同學", "申請", "截止", "日期", "獎學金", "競賽", "報名",
+    "演講", "教授", "研究所", "實習", "機會", "企業", "招募", "課程", "考試", "系辦",
+    "國立臺灣師範大學", "活動", "說明會", "資料", "繳交", "網站", "詳見", "附件", "時間", "地點",
+]
+
+BOILERPLATE = (
+    "<p>聯絡人：資訊工程學系 系辦公室</p>"
+    "<p>電話：(02)7749-6666　Email：csie@ntnu.edu.tw</p>"
+    "<p>國立臺灣師範大學 資訊工程學系 敬啟</p>"
+)
+
+@dataclass
+class Corpus:
+    posts: int = 1000
+    seed: int = 42
+    paragraphs: int = 6
+    max_categories: int = 3
+    image_ratio: float = 0.3
+    image_size_kb: int = 200
+    ## Serve a real A4 PNG poster (needs Pillow) instead of random bytes
+    posters: bool = False
+
+    def categories_of(self, post_id: int) -> list[int]:
+        rng = random.Random(self.seed * 1_000_003 + post_id)
+        ids = [cid for cid, _ in CATEGORIES.values() if cid != 1]
+        picked = rng.sample(ids, rng.randint(1, self.max_categories))
+        return [1] + picked
+
+    def post(self, post_id: int, base_url: str) -> dict:
+        rng = random.Random(self.seed * 7_919 + post_id)
+        title = "".join(rng.choice(CJK_WORDS) for _ in range(rng.randint(3, 8)))
+        body = "".join(
+            "<p>" + "，".join(rng.choice(CJK_WORDS) for _ in range(rng.randint(10, 40))) + "。</p>"
+            for _ in range(self.paragraphs)
+        )
+
+        embedded = {}
+        if rng.random() < self.image_ratio:
+            for i in range(rng.randint(1, 3)):
+                body += f'<p><img src="/wp-content/uploads/{post_id}/poster-{i}.jpg"></p>'
+            embedded["wp:featuredmedia"] = [
+                {"source_url": f"{base_url}/wp-content/uploads/{post_id}/featured.png"}
+            ]
+        if rng.random() < 0.2:
+            body += f'<p><a href="/wp-content/uploads/{post_id}/form.pdf">報名表</a></p>'
+
+        day = post_id % 28 + 1
+        month = post_id % 12 + 1
+        year = 2015 + post_id % 10
+        return {
+            "id": post_id,
+            "link": f"{base_url}/index.php/{year}/{month:02d}/{day:02d}/post-{post_id}/",
+            "date_gmt": f"{year}-{month:02d}-{day:02d}T{post_id % 24:02d}:00:00",
+            "title": {"rendered": title},
+            "content": {"rendered": f"<h2>{title}</h2>" + body + BOILERPLATE},
+            "categories": self.categories_of(post_id),
+            "_embedded": embedded,
+        }
+
+def make_poster(seed: int, size: tuple[int, int] = (2480, 3508)) -> bytes:
+    # A4 at 300 dpi with a noisy background, the typical shape of a scanned event poster
+    import io
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(seed)
+    poster = Image.effect_noise(size, 24).convert("RGB")
+    draw = ImageDraw.Draw(poster)
+    for _ in range(40):
+        x, y = rng.randrange(size[0]), rng.randrange(size[1])
+        color = tuple(rng.randrange(256) for _ in range(3))
+        draw.rectangle((x, y, x + rng.randrange(100, 800), y + rng.randrange(50, 400)), fill=color)
+    out = io.BytesIO()
+    poster.save(out, format="PNG")
+    return out.getvalue()
+
+def build_app(corpus: Corpus) -> web.Application:
+    # category id -> post ids, newest first like WordPress
+    by_category: dict[int, list[int]] = {cid: [] for cid, _ in CATEGORIES.values()}
+    for post_id in range(corpus.posts, 0, -1):
+        for cid in corpus.categories_of(post_id):
+            by_category[cid].append(post_id)
+    names = {cid: name for cid, name in CATEGORIES.values()}
+    image_bytes = make_poster(corpus.seed) if corpus.posters else random.Random(corpus.seed).randbytes(corpus.image_size_kb * 1024)
+
+    def base_url(request: web.Request) -> str:
+        return f"{request.scheme}://{request.host}"
+
+    async def category_page(request: web.Request) -> web.Response:
+        slug = request.match_info["slug"]
+        if slug not in CATEGORIES:
+            raise web.HTTPNotFound()
+        cid = CATEGORIES[slug][0]
+        link = f'<{base_url(request)}/index.php/wp-json/wp/v2/categories/{cid}>; rel="alternate"; type="application/json"'
+        return web.Response(text="<html></html>", content_type="text/html", headers={"Link": link})
+
+    async def category(request: web.Request) -> web.Response:
+        cid = int(request.match_info["cid"])
+        if cid not in names:
+            raise web.HTTPNotFound()
+        return web.json_response({"id": cid, "name": names[cid]})
+
+    async def posts(request: web.Request) -> web.Response:
+        cid = int(request.query.get("categories", 0))
+        per_page = int(request.query.get("per_page", 10))
+        page = int(request.query.get("page", 1))
+        ids = by_category.get(cid, [])
+        total_pages = max(1, math.ceil(len(ids) / per_page))
+        if page > total_pages:
+            return web.json_response({"code": "rest_post_invalid_page_number"}, status=400)
+
+        base = base_url(request)
+        items = [corpus.post(pid, base) for pid in ids[(page - 1) * per_page:page * per_page]]
+        return web.Response(
+            text=json.dumps(items, ensure_ascii=False),
+            content_type="application/json",
+            headers={"X-WP-Total": str(len(ids)), "X-WP-TotalPages": str(total_pages)},
+        )
+
+    async def media(request: web.Request) -> web.Response:
+        return web.Response(body=image_bytes, content_type="application/octet-stream")
+
+    app = web.Application()
+    app.router.add_route("*", "/index.php/category/news/{slug}/", category_page)
+    app.router.add_get("/index.php/wp-json/wp/v2/categories/{cid}", category)
+    app.router.add_get("/index.php/wp-json/wp/v2/posts", posts)
+    app.router.add_get("/wp-content/uploads/{path:.*}", media)
+    return app
+
+# Runs on its own event loop thread, the scraper uses blocking requests
+class FakeWordPress:
+    def __init__(self, corpus: Corpus, host: str = "127.0.0.1", port: int = 0):
+        self.corpus = corpus
+        self.host = host
+        self.port = port
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._runner: web.AppRunner | None = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def _start(self) -> None:
+        self._runner = web.AppRunner(build_app(self.corpus), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+
+    def start(self) -> "FakeWordPress":
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+        return self
+
+    def stop(self) -> None:
+        if self._runner:
+            asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    def __enter__(self) -> "FakeWordPress":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
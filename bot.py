@@ -1,18 +1,28 @@
 import os
+import json
+import hashlib
 import logging
 import discord
 import asyncio
 import argparse
 
 import utils.db_util as db
+import utils.metrics_util as metrics
 
 from discord.ext import commands
 from dotenv import load_dotenv
 from discord import app_commands
 from utils.log_util import setup_logging
+from config.config import METRICS_HOST, METRICS_PORT, INTENTS_MODE, SHARDED, SHARD_COUNT, SHARD_IDS
 
 log = logging.getLogger(__name__)
 
+COMMAND_HASH_KEY = "command_tree_hash"
+
+def command_tree_hash(tree: app_commands.CommandTree) -> str:
+    payload = sorted((cmd.to_dict(tree) for cmd in tree.get_commands()), key=lambda c: c["name"])
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
 def setup_arg_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description="NTNU CSIE News Discord Bot")
     parser.add_argument(
@@ -21,9 +31,24 @@ def setup_arg_parser() -> argparse.ArgumentParser:
         default="INFO",
         help="Set the logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL)",
     )
+    parser.add_argument(
+        "--log-json",
+        action="store_true",
+        help="Write logs as one JSON object per line",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Profile every news sync cycle with cProfile and write reports to logs/",
+    )
+    parser.add_argument(
+        "--profile-memory",
+        action="store_true",
+        help="With --profile, also record peak memory and top allocations with tracemalloc",
+    )
     return parser
 
-async def main_loop():
+async def main_loop(profile: bool = False, profile_memory: bool = False):
     load_dotenv()
 
     dc_token = os.getenv("DISCORD_TOKEN")
@@ -31,17 +56,42 @@ async def main_loop():
     # test_guild_obj = discord.Object(id=test_guild_id)
 
     # bot settings
-    intents = discord.Intents.all()
-    bot = commands.Bot(command_prefix="$", intents=intents)
+    if INTENTS_MODE == "all":
+        intents = discord.Intents.all()
+    else:
+        ## Forums, threads and slash commands only need the guilds intent
+        intents = discord.Intents.none()
+        intents.guilds = True
+
+    if SHARDED:
+        bot = commands.AutoShardedBot(command_prefix="$", intents=intents, shard_count=SHARD_COUNT, shard_ids=SHARD_IDS)
+        log.info(f"Sharding enabled: shard_count={SHARD_COUNT or 'auto'}, shard_ids={SHARD_IDS or 'all'}")
+    else:
+        bot = commands.Bot(command_prefix="$", intents=intents)
+    bot.profile = profile
+    bot.profile_memory = profile_memory
+    bot.commands_synced = False
 
     @bot.event
     async def on_ready():
         log.info(f'Bot logged in as {bot.user} (ID: {bot.user.id})')
+        # on_ready 在每次重新連線都會觸發，同一個行程只檢查一次
+        if bot.commands_synced:
+            return
         try:
-            # 1) 同步到 Discord 全域指令，可能需要一段時間才會生效
+            # 1) 指令樹與上次同步時相同就跳過，避免重啟時撞到 Discord 的 sync rate limit
+            tree_hash = command_tree_hash(bot.tree)
+            if await asyncio.to_thread(db.get_state, COMMAND_HASH_KEY) == tree_hash:
+                bot.commands_synced = True
+                log.info("Command tree unchanged since last sync, skipping.")
+                return
+
+            # 2) 同步到 Discord 全域指令，可能需要一段時間才會生效
             synced = await bot.tree.sync()
+            await asyncio.to_thread(db.set_state, COMMAND_HASH_KEY, tree_hash)
+            bot.commands_synced = True
 
-            # # 2) 將全域指令鏡射到測試伺服器，立即可用
+            # # 3) 將全域指令鏡射到測試伺服器，立即可用
             # bot.tree.copy_global_to(guild=test_guild_obj)
             # synced = await bot.tree.sync(guild=test_guild_obj)
 
@@ -87,6 +137,15 @@ async def main_loop():
             except Exception as e:
                 log.error(f"Failed to load cog \033[1m{filename}\033[0m: {e}")
 
+    # Start metrics endpoint
+    ## Discord 429s are retried inside discord.py and only show up in its log
+    metrics.count_discord_rate_limits()
+    if METRICS_PORT is not None:
+        try:
+            await metrics.start_metrics_server(METRICS_HOST, METRICS_PORT)
+        except OSError as e:
+            log.error(f"Failed to start metrics endpoint: {e}")
+
     # Start bot
     while True:
         try:
@@ -106,13 +165,13 @@ def main():
     
     # logging system
     os.makedirs("logs", exist_ok=True)
-    setup_logging(log_level)
+    setup_logging(log_level, json_format=args.log_json)
 
     # Initialize database
     db.init_db()
 
     try:
-        asyncio.run(main_loop())
+        asyncio.run(main_loop(args.profile, args.profile_memory))
     except KeyboardInterrupt:
         log.info("Bot shutting down.")
 
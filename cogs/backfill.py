@@ -0,0 +1,145 @@
+import discord
+import sqlite3
+import logging
+
+import services.backfill as backfill
+import services.subscriptions as subs
+import utils.db_util as db
+
+from datetime import datetime
+from typing import Optional
+from discord.ext import commands, tasks
+from discord import app_commands
+from config.config import BACKFILL_BATCH_SIZE, BACKFILL_INTERVAL_SECONDS
+
+log = logging.getLogger(__name__)
+
+STATUS_LABELS = {
+    "pending": "等待中",
+    "running": "進行中",
+    "done": "已完成",
+    "cancelled": "已取消",
+}
+
+class Backfill(commands.Cog):
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.batch_size = BACKFILL_BATCH_SIZE
+
+    async def cog_load(self):
+        self.backfill_loop.start()
+
+    def cog_unload(self):
+        self.backfill_loop.cancel()
+
+    def _get_db(self):
+        conn = db.connect(timeout=10)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _parse_date(self, value: Optional[str]) -> Optional[str]:
+        if not value:
+            return None
+        return datetime.strptime(value.strip(), "%Y-%m-%d").strftime("%Y-%m-%d")
+
+    @tasks.loop(seconds=BACKFILL_INTERVAL_SECONDS)
+    async def backfill_loop(self):
+        # 與新聞同步、repost 共用 Scheduler 的鎖；同步進行中就等下一輪
+        scheduler_cog = self.bot.get_cog("Scheduler")
+        if scheduler_cog is None or scheduler_cog._lock.locked():
+            return
+
+        async with scheduler_cog._lock:
+            # 1) 沒有待發的即時新聞時，才把一小批歷史公告移入 repost
+            shard_count, shard_ids = scheduler_cog._owned_shards()
+            with self._get_db() as conn:
+                promoted = backfill.promote(conn.cursor(), self.batch_size, shard_count, shard_ids)
+                conn.commit()
+            if not promoted:
+                return
+
+            # 2) 立即發送這一批，不必等下一次排程
+            log.info(f"回補 {promoted} 則歷史公告。")
+            await scheduler_cog.process_repost()
+
+    @backfill_loop.before_loop
+    async def _before(self):
+        await self.bot.wait_until_ready()
+
+    @app_commands.command(name="backfill", description="[管理員] 回補論壇頻道的歷史公告")
+    @app_commands.describe(
+        forum_channel="要回補的論壇頻道（需已使用 /add_forum 新增）",
+        since="起始日期 YYYY-MM-DD（含）",
+        until="結束日期 YYYY-MM-DD（含）",
+        tag="只回補此分類的公告",
+    )
+    @app_commands.checks.has_permissions(administrator=True)
+    async def start_backfill(
+        self,
+        interaction: discord.Interaction,
+        forum_channel: discord.ForumChannel,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        tag: Optional[str] = None,
+    ):
+        await interaction.response.defer(ephemeral=True)
+
+        # 1) Check arguments
+        try:
+            since, until = self._parse_date(since), self._parse_date(until)
+        except ValueError:
+            return await interaction.followup.send("日期格式錯誤，請使用 YYYY-MM-DD。")
+
+        # 2) Create job (與 repost 共用 Scheduler 的鎖，避免和發送中的批次互相競爭)
+        try:
+            scheduler_cog = self.bot.get_cog("Scheduler")
+            async with scheduler_cog._lock:
+                with self._get_db() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute("SELECT 1 FROM registered_forum WHERE channel_id = ?", (forum_channel.id,))
+                    if cursor.fetchone() is None:
+                        return await interaction.followup.send(f"頻道 {forum_channel.name} 尚未加入清單，請先使用 /add_forum。")
+
+                    job_id, total = backfill.create_job(cursor, forum_channel.id, since, until, tag)
+                    conn.commit()
+        except Exception as e:
+            log.error(f"建立回補工作失敗: {e}")
+            return await interaction.followup.send(f"建立回補工作時發生錯誤: {e}")
+
+        log.info(f"建立回補工作 #{job_id}：{forum_channel.name}，{total} 則 (since={since}, until={until}, tag={tag})。")
+        if total == 0:
+            return await interaction.followup.send("沒有符合條件且尚未發佈的公告。")
+        await interaction.followup.send(f"已建立回補工作 #{job_id}，共 {total} 則公告，將在沒有新公告待發時於背景發佈。")
+
+    @start_backfill.autocomplete("tag")
+    async def _tag_autocomplete(self, interaction: discord.Interaction, current: str) -> list[app_commands.Choice[str]]:
+        with self._get_db() as conn:
+            names = subs.search_tags(conn.cursor(), current)
+        return [app_commands.Choice(name=n, value=n) for n in names]
+
+    @app_commands.command(name="backfill_status", description="[管理員] 查看歷史公告回補進度")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def backfill_status(self, interaction: discord.Interaction):
+        await interaction.response.defer(ephemeral=True)
+
+        forum_ids = [c.id for c in interaction.guild.channels if isinstance(c, discord.ForumChannel)]
+        with self._get_db() as conn:
+            jobs = backfill.list_jobs(conn.cursor(), forum_ids)
+        if not jobs:
+            return await interaction.followup.send("目前沒有回補工作。")
+
+        lines = []
+        for job in jobs:
+            filters = ", ".join(
+                f"{k}={job[k]}" for k in ("since", "until", "tag_name") if job[k]
+            ) or "全部"
+            ## 已移入 repost 但尚未送達（等待中、失敗重試中）的公告另外列出
+            in_flight = f"，{job['in_flight']} 則發送中" if job["in_flight"] else ""
+            lines.append(
+                f"#{job['job_id']} <#{job['forum_channel_id']}> {STATUS_LABELS.get(job['status'], job['status'])} "
+                f"{job['delivered']}/{job['total']}{in_flight}（{filters}）"
+            )
+        await interaction.followup.send("\n".join(lines))
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(Backfill(bot))
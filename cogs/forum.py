@@ -1,40 +1,171 @@
 import discord
-import sqlite3
 import aiohttp
 import io
 import re
+import time
 import asyncio
+import difflib
 import logging
 
+import utils.db_util as db
+import utils.metrics_util as metrics
+import utils.circuit_breaker as cb
+import utils.image_util as image_util
+import services.post_render as pr
+import services.backfill as backfill
+import services.retention as retention
+import services.subscriptions as subs
 
 from discord.ext import commands
 from discord import app_commands
-from config.config import DB_PATH
+from services.delivery import DeliveryBackend, DiscordDelivery
+from config.config import IMAGE_MAX_SOURCE_MB
 
 log = logging.getLogger(__name__)
+
+MAX_DIFF_LENGTH = 1800
+MAX_FORUM_TAGS = 20
+
 class Forum(commands.Cog):
-    def __init__(self, bot: commands.Bot, forum_channel_ids: list[int] = None):
+    def __init__(self, bot: commands.Bot, forum_channel_ids: list[int] = None, delivery: DeliveryBackend = None):
         self.bot = bot
         self.db_lock = asyncio.Lock()
+        self.delivery: DeliveryBackend = delivery or DiscordDelivery(bot)
+        # forum_id -> {tag_name: ForumTag}，頻道更新時失效
+        self._tag_cache: dict[int, dict[str, discord.ForumTag]] = {}
+
+    def cog_unload(self):
+        image_util.shutdown()
+
+    def _get_tag_map(self, forum: discord.ForumChannel) -> dict[str, discord.ForumTag]:
+        tag_map = self._tag_cache.get(forum.id)
+        if tag_map is None:
+            tag_map = {t.name: t for t in forum.available_tags}
+            self._tag_cache[forum.id] = tag_map
+        return tag_map
+
+    async def _provision_tags(self, forum: discord.ForumChannel) -> int:
+        # 一次性以單一 channel edit 建立 tags 資料表中尚未存在的標籤
+        with db.connect() as conn:
+            tag_names = [r[0] for r in conn.execute("SELECT tag_name FROM tags ORDER BY tag_id")]
+
+        tag_map = self._get_tag_map(forum)
+        room = MAX_FORUM_TAGS - len(forum.available_tags)
+        missing = [name for name in tag_names if name not in tag_map][:max(room, 0)]
+        if not missing:
+            return 0
+
+        new_tags = [discord.ForumTag(name=name, moderated=False) for name in missing]
+        edited = await forum.edit(available_tags=list(forum.available_tags) + new_tags, reason="建立公告標籤")
+        self._tag_cache[forum.id] = {t.name: t for t in (edited or forum).available_tags}
+        log.info(f"在 {forum.name} 建立 {len(missing)} 個標籤：{', '.join(missing)}")
+        return len(missing)
     
-    async def _smart_download(self, session, url, max_mb):
+    async def _smart_download(self, session, url, max_mb, is_image=False):
+        # 圖片可先縮圖再上傳，因此允許下載超過上傳上限的原圖
+        shrinkable = is_image and image_util.enabled()
+        source_mb = max(max_mb, IMAGE_MAX_SOURCE_MB) if shrinkable else max_mb
+        ## 附件主機連續失敗時直接改用連結，不再每個檔案都等到逾時
+        breaker = cb.get(url, scope="attachment")
+        if not breaker.allow():
+            return url
+        start = time.monotonic()
+        recorded = False
         try:
             async with session.head(url, timeout=5, allow_redirects=True) as resp:
                 size_bytes = int(resp.headers.get('Content-Length', 0))
-                if size_bytes > max_mb * 1024 * 1024:
+                if size_bytes > source_mb * 1024 * 1024:
+                    breaker.record_success(time.monotonic() - start)
+                    recorded = True
                     return url
             
             async with session.get(url, timeout=15) as resp:
+                latency = time.monotonic() - start
+                if resp.status == 429:
+                    metrics.RATE_LIMITED.inc(target="attachment")
+                if resp.status == 429 or resp.status >= 500:
+                    breaker.record_failure(latency, reason=f"HTTP {resp.status}")
+                else:
+                    breaker.record_success(latency)
+                recorded = True
                 if resp.status == 200:
-                    data = io.BytesIO(await resp.read())
+                    data = await resp.read()
 
                     filename = url.split("/")[-1].split("?")[0] or "attachment"
                     filename = re.sub(r'[\\/*?:"<>|]', "", filename)
-                    return discord.File(data, filename=filename)
-        except Exception:
-            pass
+                    if shrinkable:
+                        with metrics.STAGE_SECONDS.time(stage="image_process"):
+                            data, filename = await image_util.process(data, filename)
+                    if len(data) > max_mb * 1024 * 1024:
+                        return url
+                    return discord.File(io.BytesIO(data), filename=filename)
+        except Exception as e:
+            if not recorded:
+                breaker.record_failure(time.monotonic() - start, reason=type(e).__name__)
+                recorded = True
+        finally:
+            ## 被取消 (CancelledError) 時沒有結果，只釋放 half-open 的探測名額
+            if not recorded:
+                breaker.release()
         return url
     
+    async def _download_attachments(self, image_urls: list[str], file_urls: list[str], max_mb: int):
+        upload_files = []
+        large_file_links = []
+        ## Discord limits the whole message, not each file: keep the sum under max_mb
+        budget = max_mb * 1024 * 1024
+        sources = [(u, True) for u in image_urls[:10]] + [(u, image_util.is_image_url(u)) for u in file_urls]
+        async with aiohttp.ClientSession() as session:
+            for u, is_image in sources:
+                with metrics.STAGE_SECONDS.time(stage="attachment_download"):
+                    file_obj = await self._smart_download(session, u, max_mb, is_image=is_image)
+                if isinstance(file_obj, discord.File):
+                    size = file_obj.fp.getbuffer().nbytes
+                    if len(upload_files) < 10 and size <= budget:
+                        upload_files.append(file_obj)
+                        budget -= size
+                    else:
+                        file_obj.close()
+                        large_file_links.append(u)
+                elif isinstance(file_obj, str):
+                    large_file_links.append(file_obj)
+        return upload_files, large_file_links
+
+    def _render_content(self, post: dict, large_file_links: list[str]) -> str:
+        # body 在入庫時已預先算好 (rendered_posts)，這裡只補上無法上傳的附件連結
+        body = post.get("body") or pr.render_body(post.get("content"), post.get("url"), post.get("timestamp"))
+        return pr.append_file_links(body, large_file_links)
+
+    def _existing_file_links(self, message: discord.Message) -> list[str]:
+        # 附件未變動時沿用起始訊息中的連結清單，不必重新下載判斷大小
+        if pr.FILE_LINKS_HEADER not in message.content:
+            return []
+        links = message.content.split(pr.FILE_LINKS_HEADER, 1)[1].splitlines()
+        return [line[2:] for line in links if line.startswith("- ")]
+
+    def _render_diff(self, old_content: str | None, new_content: str, attachments_changed: bool) -> str:
+        header = "📢 **【新聞內容更新通知】**\n"
+        if attachments_changed:
+            header += "📎 附加檔案已更新。\n"
+
+        diff_lines = []
+        if old_content is not None:
+            diff_lines = [
+                line.replace("```", "`\u200b``")
+                for line in difflib.unified_diff(old_content.splitlines(), new_content.splitlines(), lineterm="", n=0)
+                if not line.startswith(("---", "+++", "@@"))
+            ]
+        if not diff_lines:
+            return header + "公告內容已更新，請見討論串第一則訊息。"
+
+        body = ""
+        for i, line in enumerate(diff_lines):
+            if len(body) + len(line) + 1 > MAX_DIFF_LENGTH:
+                body += f"... (其餘 {len(diff_lines) - i} 行變更省略)\n"
+                break
+            body += line + "\n"
+        return f"{header}```diff\n{body}```"
+
     async def create_post(
         self,
         forum_id: int,
@@ -42,165 +173,142 @@ class Forum(commands.Cog):
         max_upload_size_mb: int = 24,
     ):
         # 1) Get forum channel
-        forum = self.bot.get_channel(forum_id)
-        if not isinstance(forum, discord.ForumChannel):
+        forum = self.delivery.get_forum(forum_id)
+        if forum is None:
             logging.error(f"頻道 ID {forum_id} 不是論壇頻道 (ForumChannel)。")
             return None
-        
+
         # 2) Fetch data
-        url = post.get("url", "")
         title = post.get("title", "無標題")
-        content = post.get("content", "")
-        timestamp_obj = post.get("timestamp") # 假設傳入的是 datetime 物件
         tags = post.get("tags", [])
         image_urls = post.get("images_url", [])
         file_urls = post.get("files_url", [])
 
         # 3) Download files and images
-        upload_files = []
-        large_file_links = []
-        async with aiohttp.ClientSession() as session:
-            for u in (image_urls[:10] + file_urls):
-                file_obj = await self._smart_download(session, u, max_upload_size_mb)
-                if isinstance(file_obj, discord.File):
-                    if len(upload_files) < 10:
-                        upload_files.append(file_obj)
-                    else:
-                        large_file_links.append(u)
-                elif isinstance(file_obj, str):
-                    large_file_links.append(file_obj)
-        
+        upload_files, large_file_links = await self._download_attachments(image_urls, file_urls, max_upload_size_mb)
+
         # 4) New Content
-        ## Timestamp <t:TIMESTAMP:F>
-        discord_ts = ""
-        if hasattr(timestamp_obj, 'timestamp'):
-            discord_ts = f"<t:{int(timestamp_obj.timestamp())}:F>"
-        else:
-            discord_ts = str(timestamp_obj)
-
-        new_content = (
-            f"{content[:1800]}\n\n"
-            f"{'='*30}\n"
-            f"📌 原文連結：{url}\n📅 發文時間：{discord_ts}"
-        )
-
-        if large_file_links:
-            new_content += "\n📂 附加檔案連結：\n" + "\n".join([f"- {link}" for link in large_file_links])
+        new_content = self._render_content(post, large_file_links)
 
         # 5) tags
         applied_tags = []
+        tag_map = self._get_tag_map(forum)
         for tag_id in tags:
-            tag = discord.utils.get(forum.available_tags, name=tag_id) 
-            if tag: 
+            tag = tag_map.get(tag_id)
+            if tag:
                 applied_tags.append(tag)
             else:
-                if len(forum.available_tags) + len(applied_tags) < 20:
+                ## 新增至網站的分類，add_forum 時尚未建立
+                if len(tag_map) < MAX_FORUM_TAGS:
                     try:
                         new_tag = await forum.create_tag(name=tag_id, moderated=False)
+                        tag_map[new_tag.name] = new_tag
                         applied_tags.append(new_tag)
                     except Exception as e:
                         log.error(f"無法建立新標籤 '{tag_id}'：{e}")
 
         # 6) Post thread
         try:
-            result = await forum.create_thread(
-                name=title[:100], 
-                content=new_content[:2000],
-                applied_tags=applied_tags,
-                files=upload_files,
-                reason="自動發文"
-            )
+            with metrics.STAGE_SECONDS.time(stage="discord_create"):
+                result = await forum.create_thread(
+                    name=title[:100],
+                    content=new_content,
+                    applied_tags=applied_tags,
+                    files=upload_files,
+                    reason="自動發文"
+                )
 
             log.info(f"在 {forum.name} 發佈新貼文: {result.thread.name} (ID: {result.thread.id})")
 
             for f in upload_files:
                 f.close()
-            
-            return result.thread.id 
+
+            return result.thread.id
         except Exception as e:
+            if isinstance(e, discord.HTTPException) and e.status == 429:
+                metrics.RATE_LIMITED.inc(target="discord")
             log.error(f"在 {forum.name} 發佈貼文失敗: {e}")
             return None
-    
+
     async def update_post(
         self,
         dc_thread_id: int,
         post: dict,
         max_upload_size_mb: int = 24,
     ):
-        # 1) Get threads id
-        thread = self.bot.get_channel(dc_thread_id)
-        if not isinstance(thread, discord.Thread):
-            logging.error(f"頻道 ID {dc_thread_id} 不是討論串 (Thread)。")
+        # 1) Get thread (fetched from the API when archived); other errors go back to the scheduler for a retry
+        thread = await self.delivery.get_thread(dc_thread_id)
+        if thread is None:
+            logging.error(f"討論串 {dc_thread_id} 已不存在或不是討論串 (Thread)。")
             return
-        
+
         # 2) Fetch data
-        url = post.get("url", "")
         content = post.get("content", "")
-        timestamp_obj = post.get("timestamp")
+        previous_content = post.get("previous_content")
+        attachments_changed = post.get("attachments_changed", True)
         image_urls = post.get("images_url", [])
         file_urls = post.get("files_url", [])
 
-        # 3) Download files and images
         upload_files = []
-        large_file_links = []
-        async with aiohttp.ClientSession() as session:
-            for u in (image_urls[:10] + file_urls):
-                file_obj = await self._smart_download(session, u, max_upload_size_mb)
-                if isinstance(file_obj, discord.File):
-                    if len(upload_files) < 10:
-                        upload_files.append(file_obj)
-                    else:
-                        large_file_links.append(u)
-                elif isinstance(file_obj, str):
-                    large_file_links.append(file_obj)
-
-        # 4) New Content
-        ## Timestamp <t:TIMESTAMP:F>
-        discord_ts = ""
-        if hasattr(timestamp_obj, 'timestamp'):
-            discord_ts = f"<t:{int(timestamp_obj.timestamp())}:F>"
-        else:
-            discord_ts = str(timestamp_obj)
-
-        new_content = (
-            f"📢 **【新聞內容更新通知】**\n"
-            f"{content[:1800]}\n\n"
-            f"{'='*30}\n"
-            f"📌 原文連結：{url}\n📅 發文時間：{discord_ts}"
-        )
-
-        if len(new_content) > 2000:
-                new_content = new_content[:1990] + "..."
-
-
-        if large_file_links:
-            new_content += "\n📂 附加檔案連結：\n" + "\n".join([f"- {link}" for link in large_file_links])
-
-        # 5) Send update message
         try:
-            sent_message = await thread.send(
-                content=new_content,
-                files=upload_files
-            )
+            # 3) Starter message (討論串 ID 即為起始訊息 ID)
+            starter = thread.starter_message
+            if starter is None:
+                try:
+                    starter = await thread.fetch_message(thread.id)
+                except discord.NotFound:
+                    log.warning(f"討論串 {thread.name} 的起始訊息已不存在，改為發送完整內容。")
+
+            # 4) Download files and images only if the file set changed
+            if attachments_changed or starter is None:
+                upload_files, large_file_links = await self._download_attachments(image_urls, file_urls, max_upload_size_mb)
+            else:
+                large_file_links = self._existing_file_links(starter)
+            new_content = self._render_content(post, large_file_links)
+
+            with metrics.STAGE_SECONDS.time(stage="discord_update"):
+                # 5) Send update summary (同時會解除討論串的封存)
+                if starter is None:
+                    sent_message = await thread.send(
+                        content=("📢 **【新聞內容更新通知】**\n" + new_content)[:2000],
+                        files=upload_files
+                    )
+                else:
+                    sent_message = await thread.send(
+                        content=self._render_diff(previous_content, content, attachments_changed)
+                    )
+
+                    # 6) Edit starter message in place
+                    ## 通知已送出，編輯失敗只記錄，不可讓排程誤判討論串已刪除
+                    try:
+                        if attachments_changed:
+                            await starter.edit(content=new_content, attachments=upload_files)
+                        else:
+                            await starter.edit(content=new_content)
+                    except discord.HTTPException as e:
+                        if e.status == 429:
+                            metrics.RATE_LIMITED.inc(target="discord")
+                        log.error(f"編輯討論串 {thread.name} 的起始訊息失敗 (HTTP {e.status}): {e}")
 
             log.info(f"在 {thread.name} 更新貼文，訊息 ID: {sent_message.id}")
-
-            for f in upload_files:
-                f.close()
-            
             return sent_message.id
+        except discord.NotFound:
+            logging.error(f"討論串 {dc_thread_id} 已不存在。")
         except discord.Forbidden:
+            ## 討論串仍在，交給排程稍後重試
             logging.error(f"權限不足：無法在討論串 {dc_thread_id} 發送更新。")
+            raise
         except discord.HTTPException as e:
+            if e.status == 429:
+                metrics.RATE_LIMITED.inc(target="discord")
             logging.error(f"發送更新訊息失敗 (HTTP {e.status}): {e}")
-        except Exception as e:
-            logging.error(f"更新討論串時發生未知錯誤: {e}")
+            raise
         finally:
             for f in upload_files:
                 f.close()
-        
+
         return None
-            
+
 
     def is_owner():
         async def predicate(inter: discord.Interaction):
@@ -222,8 +330,7 @@ class Forum(commands.Cog):
             ## Get scheduler cog's lock
             scheduler_cog = self.bot.get_cog("Scheduler")
             async with scheduler_cog._lock:
-                with sqlite3.connect(DB_PATH) as conn:
-                    conn.execute("PRAGMA journal_mode=WAL;")
+                with db.connect() as conn:
                     cursor = conn.cursor()
 
                     ## Check if already registered
@@ -231,27 +338,29 @@ class Forum(commands.Cog):
                     if cursor.fetchone():
                         return await interaction.followup.send(f"頻道 {forum_channel.name} 已在清單中。")
 
-                    cursor.execute("INSERT INTO registered_forum (channel_id) VALUES (?)", (forum_channel.id,))
-                    
-                    ## Sync existing posts
-                    cursor.execute("""
-                        INSERT OR IGNORE INTO repost (forum_channel_id, post_id)
-                        SELECT ?, post_id FROM posted_news
-                        WHERE post_id NOT IN (
-                            SELECT post_id FROM forum_posted 
-                            WHERE forum_channel_id = ?
-                        )
-                    """, (forum_channel.id, forum_channel.id))
+                    cursor.execute("INSERT INTO registered_forum (channel_id, guild_id) VALUES (?, ?)",
+                                   (forum_channel.id, forum_channel.guild.id))
                     
+                    ## Existing posts go through a paced backfill job, so live news is not delayed
+                    job_id, total = backfill.create_job(cursor, forum_channel.id)
+
                     conn.commit()
 
             # 4) Update in-memory list
             if hasattr(self, "forum_channel_list"):
                 self.forum_channel_list.append(forum_channel.id)
 
-            # 5) Notify success
-            log.info(f"新增論壇頻道 {forum_channel.name} (ID: {forum_channel.id}) 並同步現有貼文任務。")
-            await interaction.followup.send(f"已成功新增頻道 **{forum_channel.name}** 並同步現有貼文任務。")
+            # 5) Provision tags
+            try:
+                await self._provision_tags(forum_channel)
+            except discord.HTTPException as e:
+                log.warning(f"無法在 {forum_channel.name} 預先建立標籤：{e}")
+
+            # 6) Notify success
+            log.info(f"新增論壇頻道 {forum_channel.name} (ID: {forum_channel.id})，建立回補工作 #{job_id}（{total} 則）。")
+            await interaction.followup.send(
+                f"已成功新增頻道 **{forum_channel.name}**，歷史公告將於背景回補（工作 #{job_id}，共 {total} 則，可用 `/backfill_status` 查看進度）。"
+            )
 
         except Exception as e:
             log.error(f"add_forum 失敗: {e}")
@@ -265,12 +374,10 @@ class Forum(commands.Cog):
         try:
             scheduler_cog = self.bot.get_cog("Scheduler")
             async with scheduler_cog._lock:
-                with sqlite3.connect(DB_PATH) as conn:
-                    conn.execute("PRAGMA journal_mode=WAL;")
+                with db.connect() as conn:
                     cursor = conn.cursor()
 
-                    cursor.execute("DELETE FROM registered_forum WHERE channel_id = ?", (forum_channel.id,))
-                    cursor.execute("DELETE FROM repost WHERE forum_channel_id = ?", (forum_channel.id,))
+                    retention.remove_forums(cursor, [forum_channel.id], keep_posted=True)
                     conn.commit()
 
             if hasattr(self, "forum_channel_list"):
@@ -283,23 +390,82 @@ class Forum(commands.Cog):
             log.error(f"remove_forum 失敗: {e}")
             await interaction.followup.send(f"移除過程中發生錯誤: {e}")
 
+    async def _change_subscription(self, interaction: discord.Interaction, forum_channel: discord.ForumChannel, tag: str, add: bool):
+        await interaction.response.defer(ephemeral=True)
+
+        try:
+            scheduler_cog = self.bot.get_cog("Scheduler")
+            async with scheduler_cog._lock:
+                with db.connect() as conn:
+                    cursor = conn.cursor()
+
+                    ## Check if registered
+                    cursor.execute("SELECT 1 FROM registered_forum WHERE channel_id = ?", (forum_channel.id,))
+                    if cursor.fetchone() is None:
+                        return await interaction.followup.send(f"頻道 {forum_channel.name} 尚未加入清單，請先使用 /add_forum。")
+
+                    ## Only tags the site uses; a typo would silently filter out every post
+                    if add and not subs.tag_exists(cursor, tag):
+                        return await interaction.followup.send(f"找不到分類 **{tag}**，請從自動完成清單中選擇。")
+
+                    ## Update subscriptions and drop queued posts that no longer match
+                    if add:
+                        removed = subs.subscribe(cursor, forum_channel.id, tag)
+                    else:
+                        removed = subs.unsubscribe(cursor, forum_channel.id, tag)
+                    removed += backfill.prune_unsubscribed(cursor, forum_channel.id)
+                    tags = subs.get_tags(cursor, forum_channel.id)
+                    conn.commit()
+
+            action = "訂閱" if add else "取消訂閱"
+            log.info(f"{forum_channel.name} {action}分類 {tag}，移除 {removed} 筆待發任務。")
+            current = "、".join(tags) if tags else "全部分類"
+            await interaction.followup.send(
+                f"已{action} **{tag}**。{forum_channel.name} 目前接收：{current}"
+                + (f"（已移除 {removed} 筆不再需要的待發公告）" if removed else "")
+            )
+        except Exception as e:
+            log.error(f"更新訂閱失敗: {e}")
+            await interaction.followup.send(f"更新訂閱時發生錯誤: {e}")
+
+    async def _tag_autocomplete(self, interaction: discord.Interaction, current: str) -> list[app_commands.Choice[str]]:
+        with db.connect() as conn:
+            names = subs.search_tags(conn.cursor(), current)
+        return [app_commands.Choice(name=n, value=n) for n in names]
+
+    @app_commands.command(name="subscribe", description="論壇頻道只接收指定分類的公告（可多次訂閱）")
+    @app_commands.checks.has_permissions(administrator=True)
+    @app_commands.autocomplete(tag=_tag_autocomplete)
+    async def subscribe(self, interaction: discord.Interaction, forum_channel: discord.ForumChannel, tag: str):
+        await self._change_subscription(interaction, forum_channel, tag, add=True)
+
+    @app_commands.command(name="unsubscribe", description="取消論壇頻道對指定分類的訂閱（全部取消則接收所有公告）")
+    @app_commands.checks.has_permissions(administrator=True)
+    @app_commands.autocomplete(tag=_tag_autocomplete)
+    async def unsubscribe(self, interaction: discord.Interaction, forum_channel: discord.ForumChannel, tag: str):
+        await self._change_subscription(interaction, forum_channel, tag, add=False)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_update(self, before: discord.abc.GuildChannel, after: discord.abc.GuildChannel):
+        if isinstance(after, discord.ForumChannel):
+            self._tag_cache.pop(after.id, None)
+
     @commands.Cog.listener()
     async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel):
         if not isinstance(channel, discord.ForumChannel):
             return
+
+        self._tag_cache.pop(channel.id, None)
         
         log.info(f"偵測到論壇頻道被刪除：{channel.name} (ID: {channel.id})，自動從資料庫移除。")
 
         try:
             scheduler_cog = self.bot.get_cog("Scheduler")
             async with scheduler_cog._lock:
-                with sqlite3.connect(DB_PATH) as conn:
-                    conn.execute("PRAGMA journal_mode=WAL;")
+                with db.connect() as conn:
                     cursor = conn.cursor()
 
-                    cursor.execute("DELETE FROM registered_forum WHERE channel_id = ?", (channel.id,))
-                    cursor.execute("DELETE FROM repost WHERE forum_channel_id = ?", (channel.id,))
-                    cursor.execute("DELETE FROM forum_posted WHERE forum_channel_id = ?", (channel.id,))
+                    retention.remove_forums(cursor, [channel.id])
                     conn.commit()
 
             if hasattr(self, "forum_channel_list"):
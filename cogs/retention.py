@@ -0,0 +1,39 @@
+import asyncio
+import logging
+
+import services.retention as retention
+
+from discord.ext import commands, tasks
+from config.config import RETENTION_INTERVAL_HOURS
+
+log = logging.getLogger(__name__)
+
+class Retention(commands.Cog):
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+
+    async def cog_load(self):
+        self.retention_loop.start()
+
+    def cog_unload(self):
+        self.retention_loop.cancel()
+
+    @tasks.loop(hours=RETENTION_INTERVAL_HOURS)
+    async def retention_loop(self):
+        # 與新聞同步、repost 共用 Scheduler 的鎖，避免清理到正在發送的資料
+        scheduler_cog = self.bot.get_cog("Scheduler")
+        if scheduler_cog is None:
+            return
+
+        async with scheduler_cog._lock:
+            try:
+                await asyncio.to_thread(retention.run_retention)
+            except Exception as e:
+                log.error(f"資料保留清理失敗: {e}", exc_info=True)
+
+    @retention_loop.before_loop
+    async def _before(self):
+        await self.bot.wait_until_ready()
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(Retention(bot))
@@ -3,32 +3,41 @@ import sqlite3
 import logging
 
 import services.news_processer as np
+import services.repost_queue as rq
+import services.retention as retention
+import utils.db_util as db
+import utils.metrics_util as metrics
+import utils.profile_util as profile_util
 
-from datetime import datetime
-from zoneinfo import ZoneInfo
-from typing import Dict, Any
 from discord.ext import commands, tasks
-from config.config import UPDATE_MINUTES, DB_PATH
+from config.config import UPDATE_MINUTES, REPOST_BATCH_SIZE, REPOST_INTERVAL_SECONDS, SCRAPER_MODE, REPOST_POLL_SECONDS
 
 log = logging.getLogger(__name__)
 
-TAIPEI_TZ = ZoneInfo("Asia/Taipei")
-
 class Scheduler(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
         self._lock = asyncio.Lock()
+        self.repost_batch_size = REPOST_BATCH_SIZE
+        self.repost_interval = REPOST_INTERVAL_SECONDS
+        self._watch_conn = None
+        self._data_version = None
 
     async def cog_load(self):
-        self.scheduled_post.start()
+        if SCRAPER_MODE == "external":
+            self.watch_repost.start()
+        else:
+            self.scheduled_post.start()
 
     def cog_unload(self):
         self.scheduled_post.cancel()
+        self.watch_repost.cancel()
+        if self._watch_conn is not None:
+            self._watch_conn.close()
+            self._watch_conn = None
 
     def _get_db(self):
-        conn = sqlite3.connect(DB_PATH, timeout=10) 
-        conn.execute("PRAGMA journal_mode=WAL;")
-        conn.execute("PRAGMA foreign_keys = ON;") # Foreign key support
+        conn = db.connect(timeout=10)
         conn.row_factory = sqlite3.Row
         return conn
 
@@ -37,115 +46,140 @@ class Scheduler(commands.Cog):
         async with self._lock:
             # 1) Update news
             log.info("Updating news database...")
-            await asyncio.to_thread(np.update_news)
+            if getattr(self.bot, "profile", False):
+                ## cProfile only records the worker thread, so the event loop stays out of the report
+                await asyncio.to_thread(
+                    profile_util.run_profiled, np.update_news, "update_news",
+                    trace_memory=getattr(self.bot, "profile_memory", False),
+                )
+            else:
+                await asyncio.to_thread(np.update_news)
             log.info("News database updated.")
 
-            # 2) Get repost tasks
-            with self._get_db() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT 
-                        r.forum_channel_id, 
-                        r.post_id, 
-                        p.title, 
-                        p.url, 
-                        p.content, 
-                        p.timestamp, 
-                        f.dc_thread_id
-                    FROM repost r
-                    JOIN posted_news p ON r.post_id = p.post_id
-                    LEFT JOIN forum_posted f ON r.forum_channel_id = f.forum_channel_id AND r.post_id = f.post_id
-                    WHERE p.timestamp <= datetime('now')
-                    ORDER BY
-                        (f.dc_thread_id IS NOT NULL) ASC,
-                        p.timestamp ASC
-                    LIMIT 50
-                """)
-                tasks_rows = cursor.fetchall()
-                if not tasks_rows: 
-                    log.info("No pending repost tasks found.")
-                    return
-
-                forum_cog = self.bot.get_cog("Forum")
-                log.info(f"Found {len(tasks_rows)} repost tasks to process.")
-                if not forum_cog: 
-                    return
-
-                # 3) Get additional post info
-                posts_info = self._get_posts_additional_info(cursor, {row['post_id'] for row in tasks_rows})
-
-                # 4) Process repost tasks
-                ok = 0
-                for row in tasks_rows:
-                    f_id = row['forum_channel_id']
-                    forum = self.bot.get_channel(f_id)
-
-                    if forum is None:
-                        log.warning(f"偵測到失效頻道 ID {f_id}，自動從資料庫移除。")
-                        cursor.execute("DELETE FROM registered_forum WHERE channel_id = ?", (f_id,))
-                        cursor.execute("DELETE FROM repost WHERE forum_channel_id = ?", (f_id,))
-                        cursor.execute("DELETE FROM forum_posted WHERE forum_channel_id = ?", (f_id,))
-                        conn.commit()
-                        continue
-
-                    p_id = row['post_id']
-                    info = posts_info.get(p_id, {})
-
-                    post_data = {
-                        "url": row['url'],
-                        "title": row['title'],
-                        "content": row['content'],
-                        "timestamp": datetime.fromisoformat(row['timestamp']).replace(tzinfo=TAIPEI_TZ) if row['timestamp'] else None,
-                        "tags": info.get("tags", []),
-                        "images_url": info.get("image_urls", []),
-                        "files_url": info.get("file_urls", [])
-                    }
-
-                    try:
-                        if row['dc_thread_id'] is None:
-                            # Create new post
-                            new_dc_id = await forum_cog.create_post(f_id, post_data)
-                            if new_dc_id:
-                                cursor.execute("INSERT OR REPLACE INTO forum_posted (forum_channel_id, post_id, dc_thread_id) VALUES (?, ?, ?)",
-                                               (f_id, p_id, str(new_dc_id)))
-                            else:
-                                log.warning(f"Failed to create post {p_id} in forum channel {f_id}. Skipping repost task.")
-                                continue
+            # 2) Deliver pending reposts
+            await self.process_repost()
+
+    @tasks.loop(seconds=REPOST_POLL_SECONDS)
+    async def watch_repost(self):
+        # External scraper: data_version only changes when another connection commits,
+        # so polling it on one long-lived connection is a cheap "new work" signal
+        if self._watch_conn is None:
+            self._watch_conn = db.connect(timeout=10)
+        version = self._watch_conn.execute("PRAGMA data_version").fetchone()[0]
+        changed = version != self._data_version
+        self._data_version = version
+
+        ## Rows whose retry_at has passed and posts dated in the future become due without any
+        ## commit (a scrape without changes writes nothing), so also check for due rows
+        if not changed:
+            shard_count, shard_ids = self._owned_shards()
+            if not rq.has_pending(self._watch_conn.cursor(), shard_count, shard_ids, live_only=False):
+                return
+
+        async with self._lock:
+            await self.process_repost()
+
+    def _owned_shards(self) -> tuple[int | None, list[int] | None]:
+        # None: this process runs every shard (or is not sharded) and owns every forum
+        shard_ids = getattr(self.bot, "shard_ids", None)
+        if not shard_ids or not self.bot.shard_count or len(set(shard_ids)) >= self.bot.shard_count:
+            return None, None
+        return self.bot.shard_count, list(shard_ids)
+
+    def _assign_guilds(self, cursor, forum_cog) -> None:
+        # Forums registered before sharding support have no guild_id yet
+        cursor.execute("SELECT channel_id FROM registered_forum WHERE guild_id IS NULL")
+        for (channel_id,) in cursor.fetchall():
+            channel = forum_cog.delivery.get_channel(channel_id)
+            guild = getattr(channel, "guild", None)
+            if guild is not None:
+                cursor.execute("UPDATE registered_forum SET guild_id = ? WHERE channel_id = ?", (guild.id, channel_id))
+
+    async def process_repost(self):
+        # 1) Get repost tasks of the forums handled by this process
+        with self._get_db() as conn:
+            cursor = conn.cursor()
+            forum_cog = self.bot.get_cog("Forum")
+            if forum_cog:
+                self._assign_guilds(cursor, forum_cog)
+                conn.commit()
+
+            shard_count, shard_ids = self._owned_shards()
+            tasks_rows = rq.fetch_batch(cursor, limit=self.repost_batch_size, shard_count=shard_count, shard_ids=shard_ids)
+            metrics.REPOST_QUEUE_DEPTH.set(cursor.execute("SELECT COUNT(*) FROM repost").fetchone()[0])
+            if not tasks_rows: 
+                log.info("No pending repost tasks found.")
+                return
+
+            log.info(f"Found {len(tasks_rows)} repost tasks to process.")
+            if not forum_cog: 
+                return
+
+            # 2) Process repost tasks
+            ok = 0
+            dead_forums: set[int] = set()
+            for row in tasks_rows:
+                f_id = row['forum_channel_id']
+                if f_id in dead_forums:
+                    continue
+                forum = forum_cog.delivery.get_channel(f_id)
+
+                ## Rows of other shards' forums are filtered out above, so a missing channel is really gone
+                if forum is None:
+                    log.warning(f"偵測到失效頻道 ID {f_id}，自動從資料庫移除。")
+                    dead_forums.add(f_id)
+                    continue
+
+                p_id = row['post_id']
+                post_data = row['post']
+
+                try:
+                    if row['dc_thread_id'] is None:
+                        # Create new post
+                        new_dc_id = await forum_cog.create_post(f_id, post_data)
+                        if new_dc_id:
+                            cursor.execute("INSERT OR REPLACE INTO forum_posted (forum_channel_id, post_id, dc_thread_id) VALUES (?, ?, ?)",
+                                           (f_id, p_id, str(new_dc_id)))
                         else:
-                            # Update existing post
-                            dc_thread_id = int(row['dc_thread_id'])
-                            msg_id = await forum_cog.update_post(dc_thread_id, post_data)
-                            if msg_id is None:
-                                log.warning(f"Post {p_id} in forum channel {f_id} seems to be deleted. Removing repost task.")
-                                cursor.execute("DELETE FROM forum_posted WHERE forum_channel_id = ? AND post_id = ?", (f_id, p_id))
-                                cursor.execute("DELETE FROM repost WHERE forum_channel_id = ? AND post_id = ?", (f_id, p_id))
-                                conn.commit()
-                                continue
-
-                        # 成功後刪除任務並提交
-                        cursor.execute("DELETE FROM repost WHERE forum_channel_id = ? AND post_id = ?", (f_id, p_id))
-                        conn.commit()
-                        ok += 1
-
-
-                    except Exception as e:
-                        log.error(f"Failed to post to forum channel {f_id} for post {p_id}: {e}")
-                    
-                    # time limit
-                    await asyncio.sleep(10)
-                
-                log.info(f"Repost task processing completed: {ok}/{len(tasks_rows)} succeeded.")
-
-    def _get_posts_additional_info(self, cursor, post_ids: set) -> Dict[int, Any]:
-        info = {}
-        for p_id in post_ids:
-            tags = [r[0] for r in cursor.execute("SELECT t.tag_name FROM tags t JOIN post_tags pt ON t.tag_id = pt.tag_id WHERE pt.post_id = ?", (p_id,)).fetchall()]
-            imgs = [r[0] for r in cursor.execute("SELECT image_url FROM images WHERE post_id = ?", (p_id,)).fetchall()]
-            files = [r[0] for r in cursor.execute("SELECT file_url FROM files WHERE post_id = ?", (p_id,)).fetchall()]
-            info[p_id] = {"tags": tags, "image_urls": imgs, "file_urls": files}
-        return info
+                            log.warning(f"Failed to create post {p_id} in forum channel {f_id}. Retrying later.")
+                            rq.mark_failed(cursor, f_id, p_id)
+                            conn.commit()
+                            continue
+                    else:
+                        # Update existing post
+                        dc_thread_id = int(row['dc_thread_id'])
+                        msg_id = await forum_cog.update_post(dc_thread_id, post_data)
+                        if msg_id is None:
+                            log.warning(f"Post {p_id} in forum channel {f_id} seems to be deleted. Removing repost task.")
+                            cursor.execute("DELETE FROM forum_posted WHERE forum_channel_id = ? AND post_id = ?", (f_id, p_id))
+                            cursor.execute("DELETE FROM repost WHERE forum_channel_id = ? AND post_id = ?", (f_id, p_id))
+                            conn.commit()
+                            continue
+
+                    # 成功後刪除任務並提交
+                    cursor.execute("DELETE FROM repost WHERE forum_channel_id = ? AND post_id = ?", (f_id, p_id))
+                    conn.commit()
+                    ok += 1
+
+
+                except Exception as e:
+                    log.error(f"Failed to post to forum channel {f_id} for post {p_id}: {e}")
+                    rq.mark_failed(cursor, f_id, p_id)
+                    conn.commit()
+
+                # time limit
+                await asyncio.sleep(self.repost_interval)
+
+            ## 失效頻道在整批處理完後一次移除
+            if dead_forums:
+                retention.remove_forums(cursor, list(dead_forums))
+                conn.commit()
+
+            log.info(f"Repost task processing completed: {ok}/{len(tasks_rows)} succeeded.")
+            metrics.REPOST_QUEUE_DEPTH.set(cursor.execute("SELECT COUNT(*) FROM repost").fetchone()[0])
 
     @scheduled_post.before_loop
+    @watch_repost.before_loop
     async def _before(self):
         await self.bot.wait_until_ready()
 
@@ -0,0 +1,163 @@
+import discord
+import sqlite3
+import asyncio
+import logging
+
+import utils.db_util as db
+import utils.content_util as cu
+
+from discord.ext import commands
+from discord import app_commands
+
+log = logging.getLogger(__name__)
+
+# trigram tokenizer 只能以 >= 3 個字元的詞做 MATCH；純中日韓文字的 2 字詞 (競賽、實習) 改查 bigram 索引，
+# 其他短詞 (單一字元、AI、A資) 用 LIKE 掃描以保留子字串比對
+MIN_MATCH_LENGTH = 3
+MIN_BIGRAM_LENGTH = 2
+SNIPPET_TOKENS = 24
+
+class Search(commands.Cog):
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+
+    def _get_db(self):
+        conn = db.connect(timeout=10)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _build_match_query(self, terms: list[str]) -> str:
+        # 每個詞都包成 FTS5 字串，避免使用者輸入被當成查詢語法
+        return " ".join('"' + t.replace('"', '""') + '"' for t in terms)
+
+    def _make_snippet(self, content: str, term: str) -> str:
+        content = content or ""
+        idx = content.lower().find(term.lower())
+        if idx < 0:
+            return content[:SNIPPET_TOKENS * 4].replace("\n", " ")
+        start = max(0, idx - SNIPPET_TOKENS * 2)
+        end = min(len(content), idx + len(term) + SNIPPET_TOKENS * 2)
+        snippet = (
+            content[start:idx]
+            + f"**{content[idx:idx + len(term)]}**"
+            + content[idx + len(term):end]
+        ).replace("\n", " ")
+        return ("…" if start > 0 else "") + snippet + ("…" if end < len(content) else "")
+
+    def search_news(self, keyword: str, limit: int) -> list[dict]:
+        terms = keyword.split()
+        if not terms:
+            return []
+
+        with self._get_db() as conn:
+            cursor = conn.cursor()
+            if all(len(t) >= MIN_MATCH_LENGTH for t in terms):
+                # 1) FTS5 index lookup ranked by bm25
+                cursor.execute("""
+                    SELECT
+                        p.post_id,
+                        p.title,
+                        p.url,
+                        p.timestamp,
+                        snippet(posted_news_fts, 1, '**', '**', '…', ?) AS snippet
+                    FROM posted_news_fts
+                    JOIN posted_news p ON p.post_id = posted_news_fts.rowid
+                    WHERE posted_news_fts MATCH ?
+                    ORDER BY rank
+                    LIMIT ?
+                """, (SNIPPET_TOKENS, self._build_match_query(terms), limit))
+                rows = [dict(r) for r in cursor.fetchall()]
+            elif all(len(t) >= MIN_BIGRAM_LENGTH and cu.is_cjk(t) for t in terms):
+                # 2) Two-character CJK keywords: bigram index ranked by bm25
+                match = self._build_match_query([cu.bigram_text(t).strip() for t in terms])
+                cursor.execute(f"""
+                    SELECT p.post_id, p.title, p.url, p.timestamp, {cu.content_sql("p")} AS content
+                    FROM posted_news_bigram
+                    JOIN posted_news p ON p.post_id = posted_news_bigram.rowid
+                    WHERE posted_news_bigram MATCH ?
+                    ORDER BY rank
+                    LIMIT ?
+                """, (match, limit))
+                rows = []
+                for r in cursor.fetchall():
+                    row = dict(r)
+                    row["snippet"] = self._make_snippet(cu.decode_content(row.pop("content")), terms[0])
+                    rows.append(row)
+            else:
+                # 3) Other short keywords: substring scan, newest first
+                where = " AND ".join("(f.title LIKE ? OR f.content LIKE ?)" for _ in terms)
+                params = []
+                for t in terms:
+                    pattern = f"%{t}%"
+                    params.extend([pattern, pattern])
+                cursor.execute(f"""
+                    SELECT p.post_id, p.title, p.url, p.timestamp, {cu.content_sql("p")} AS content
+                    FROM posted_news_fts f
+                    JOIN posted_news p ON p.post_id = f.rowid
+                    WHERE {where}
+                    ORDER BY p.timestamp DESC
+                    LIMIT ?
+                """, (*params, limit))
+                rows = []
+                for r in cursor.fetchall():
+                    row = dict(r)
+                    row["snippet"] = self._make_snippet(cu.decode_content(row.pop("content")), terms[0])
+                    rows.append(row)
+
+            if not rows:
+                return []
+
+            # 4) Thread links
+            placeholders = ",".join("?" for _ in rows)
+            cursor.execute(f"""
+                SELECT post_id, forum_channel_id, dc_thread_id
+                FROM forum_posted
+                WHERE post_id IN ({placeholders})
+            """, [r["post_id"] for r in rows])
+            threads: dict[int, list[tuple[int, int]]] = {}
+            for r in cursor.fetchall():
+                threads.setdefault(r["post_id"], []).append((r["forum_channel_id"], int(r["dc_thread_id"])))
+
+        for row in rows:
+            row["threads"] = threads.get(row["post_id"], [])
+        return rows
+
+    @app_commands.command(name="search", description="搜尋已發佈的系網公告")
+    @app_commands.describe(keyword="搜尋關鍵字（以空白分隔多個關鍵字）", limit="顯示筆數")
+    async def search(
+        self,
+        interaction: discord.Interaction,
+        keyword: str,
+        limit: app_commands.Range[int, 1, 10] = 5,
+    ):
+        await interaction.response.defer(ephemeral=True)
+
+        try:
+            results = await asyncio.to_thread(self.search_news, keyword, limit)
+        except sqlite3.Error as e:
+            log.error(f"search 失敗: {e}")
+            return await interaction.followup.send(f"搜尋過程中發生錯誤: {e}")
+
+        if not results:
+            return await interaction.followup.send(f"找不到與「{keyword}」相關的公告。")
+
+        guild = interaction.guild
+        guild_forum_ids = {f.id for f in guild.forums} if guild else set()
+
+        embed = discord.Embed(title=f"🔍 「{keyword}」的搜尋結果", color=discord.Color.blurple())
+        for row in results:
+            links = [f"[原文連結]({row['url']})"]
+            for forum_id, thread_id in row["threads"]:
+                if forum_id in guild_forum_ids:
+                    links.append(f"[討論串](https://discord.com/channels/{guild.id}/{thread_id})")
+                    break
+
+            value = f"{row['snippet'] or ''}\n{' | '.join(links)}"
+            embed.add_field(name=(row["title"] or "無標題")[:256], value=value[:1024], inline=False)
+
+        log.info(f"search '{keyword}' 找到 {len(results)} 筆結果。")
+        await interaction.followup.send(embed=embed)
+
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(Search(bot))
@@ -1,37 +1,111 @@
 import os
-import requests
 
 
 # Database path
 _current_file = os.path.abspath(__file__)
 _config_dir = os.path.dirname(_current_file)
 BASE_DIR = os.path.dirname(_config_dir)
-DB_PATH = os.path.join(BASE_DIR, "data", "data.db")
+DB_PATH = os.getenv("NEWS_DB_PATH", os.path.join(BASE_DIR, "data", "data.db"))
+
+# Gateway: "minimal" (guilds only, enough for forums and slash commands) or "all" intents
+INTENTS_MODE = os.getenv("NEWS_INTENTS", "minimal")
+
+# Sharding: NEWS_SHARDED=1 runs an AutoShardedBot. With NEWS_SHARD_COUNT and NEWS_SHARD_IDS (e.g. "0,1")
+# each process only connects and delivers for the guilds of its own shards
+SHARDED = os.getenv("NEWS_SHARDED", "0").lower() in ("1", "true", "yes")
+SHARD_COUNT = int(os.getenv("NEWS_SHARD_COUNT")) if os.getenv("NEWS_SHARD_COUNT") else None
+SHARD_IDS = [int(x) for x in os.getenv("NEWS_SHARD_IDS", "").split(",") if x.strip()] or None
+
+# Logging: keep 1 in N DEBUG records of these noisy loggers (children included).
+# urllib3 logs every request of the scraper, aiohttp every request of the metrics server
+LOG_DEBUG_SAMPLING = {
+    "urllib3.connectionpool": 10,
+    "aiohttp": 10,
+    "utils.image_util": 10,
+}
 
 # Update interval in minutes
 UPDATE_MINUTES = 30
 
+# Scraper placement: "embedded" runs update_news inside the bot process, "external" leaves it to
+# scraper.py (its own process/container) and the bot only drains repost when the DB changes
+SCRAPER_MODE = os.getenv("NEWS_SCRAPER_MODE", "embedded")
+## How often the bot checks PRAGMA data_version for new work in external mode
+REPOST_POLL_SECONDS = 15
+
+# Repost pacing: tasks per scheduler run and seconds between Discord posts
+REPOST_BATCH_SIZE = 50
+REPOST_INTERVAL_SECONDS = 10
+## A failed delivery is retried after REPOST_RETRY_SECONDS, doubling up to REPOST_RETRY_MAX_SECONDS
+REPOST_RETRY_SECONDS = 60
+REPOST_RETRY_MAX_SECONDS = 6 * 60 * 60
+
+# Historical backfill pacing: posts moved into repost per round (only while no live news is pending)
+BACKFILL_BATCH_SIZE = 10
+BACKFILL_INTERVAL_SECONDS = 60
+
+# Retention, run by the Retention cog every RETENTION_INTERVAL_HOURS
+RETENTION_INTERVAL_HOURS = 24
+## Bodies of posts older than this move to posted_news_archive (still searchable); None keeps them inline
+RETENTION_CONTENT_DAYS = 365
+## Finished or cancelled backfill jobs older than this are deleted
+RETENTION_JOB_DAYS = 30
+## Free pages handed back per run with PRAGMA incremental_vacuum, None for all of them
+RETENTION_VACUUM_PAGES = None
+
+# posted_news.content storage format: "zlib" (with a trained shared dictionary) or None for plain text
+CONTENT_COMPRESSION = "zlib"
+
+# Image downscaling before upload (needs Pillow: uv sync --extra images)
+IMAGE_PROCESSING = True
+## "thread" or "process" pool, and its size
+IMAGE_POOL = "thread"
+IMAGE_WORKERS = 2
+## Longest side after downscaling, JPEG quality, and the size below which images are sent as-is
+IMAGE_MAX_DIMENSION = 2048
+IMAGE_JPEG_QUALITY = 85
+IMAGE_MIN_BYTES = 512 * 1024
+## Images larger than this are not downloaded at all, even if they could be shrunk
+IMAGE_MAX_SOURCE_MB = 50
+IMAGE_CACHE_DIR = os.path.join(os.path.dirname(DB_PATH), "image_cache")
+## Cached images not used for this many days are deleted by retention
+IMAGE_CACHE_MAX_AGE_DAYS = 30
+
+# Prometheus-style metrics endpoint (http://METRICS_HOST:METRICS_PORT/metrics), NEWS_METRICS_PORT=0 to disable.
+# In Docker set NEWS_METRICS_HOST=0.0.0.0, container loopback is not reachable from the host
+METRICS_HOST = os.getenv("NEWS_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("NEWS_METRICS_PORT", "9108")) or None
+## scraper.py serves its own metrics (fetch, parse, db_upsert, circuit breakers) on another port
+SCRAPER_METRICS_PORT = int(os.getenv("NEWS_SCRAPER_METRICS_PORT", "9109")) or None
+
 # Web scraping config
-BASE_URL = "https://www.csie.ntnu.edu.tw"
-WP_API_BASE = "https://www.csie.ntnu.edu.tw/index.php/wp-json/wp/v2"
+## NEWS_BASE_URL points the scraper at another WordPress site (e.g. the offline benchmark stand-in)
+BASE_URL = os.getenv("NEWS_BASE_URL", "https://www.csie.ntnu.edu.tw")
+WP_API_BASE = f"{BASE_URL}/index.php/wp-json/wp/v2"
 
 CATEGORY_URLS = [
-    "https://www.csie.ntnu.edu.tw/index.php/category/news/competition/",
-    "https://www.csie.ntnu.edu.tw/index.php/category/news/announcement/",
-    "https://www.csie.ntnu.edu.tw/index.php/category/news/seminar/",
-    "https://www.csie.ntnu.edu.tw/index.php/category/news/enrollment/",
-    "https://www.csie.ntnu.edu.tw/index.php/category/news/honor-roll/",
-    "https://www.csie.ntnu.edu.tw/index.php/category/news/scholarship/",
-    "https://www.csie.ntnu.edu.tw/index.php/category/news/intern/",
-    "https://www.csie.ntnu.edu.tw/index.php/category/news/recruitment/",
-    "https://www.csie.ntnu.edu.tw/index.php/category/news/1/", 
+    f"{BASE_URL}/index.php/category/news/competition/",
+    f"{BASE_URL}/index.php/category/news/announcement/",
+    f"{BASE_URL}/index.php/category/news/seminar/",
+    f"{BASE_URL}/index.php/category/news/enrollment/",
+    f"{BASE_URL}/index.php/category/news/honor-roll/",
+    f"{BASE_URL}/index.php/category/news/scholarship/",
+    f"{BASE_URL}/index.php/category/news/intern/",
+    f"{BASE_URL}/index.php/category/news/recruitment/",
+    f"{BASE_URL}/index.php/category/news/1/", 
 ]
 
-SESSION = requests.Session()
-SESSION.headers.update({
+## Circuit breaker per host (department site and attachment hosts), see utils/circuit_breaker.py
+CIRCUIT_FAILURE_THRESHOLD = 3
+CIRCUIT_RESET_SECONDS = 60
+CIRCUIT_MAX_RESET_SECONDS = 30 * 60
+CIRCUIT_SLOW_SECONDS = 20
+
+## Headers of the scraper's requests.Session (created lazily in services/scrape_web.py)
+HTTP_HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
                   "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
     "Accept": "application/json,text/html;q=0.9,*/*;q=0.8",
     "Accept-Language": "zh-TW,zh;q=0.9,en;q=0.6",
     "Connection": "keep-alive",
-})
\ No newline at end of file
+}
@@ -0,0 +1,92 @@
+import os
+import time
+import logging
+import argparse
+
+import utils.db_util as db
+import utils.metrics_util as metrics
+import utils.profile_util as profile_util
+import services.news_processer as np
+
+from utils.log_util import setup_logging
+from config.config import UPDATE_MINUTES, METRICS_HOST, SCRAPER_METRICS_PORT
+
+log = logging.getLogger(__name__)
+
+def setup_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="NTNU CSIE News scraper worker (NEWS_SCRAPER_MODE=external)")
+    parser.add_argument(
+        "--log-level",
+        type=str,
+        default="INFO",
+        help="Set the logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL)",
+    )
+    parser.add_argument(
+        "--once",
+        action="store_true",
+        help="Run a single sync cycle and exit",
+    )
+    parser.add_argument(
+        "--log-json",
+        action="store_true",
+        help="Write logs as one JSON object per line",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Profile every news sync cycle with cProfile and write reports to logs/",
+    )
+    parser.add_argument(
+        "--profile-memory",
+        action="store_true",
+        help="With --profile, also record peak memory and top allocations with tracemalloc",
+    )
+    return parser
+
+def run_cycle(args: argparse.Namespace) -> None:
+    # update_news commits into the shared WAL database; the bot notices the new
+    # data_version and drains repost on its own
+    log.info("Updating news database...")
+    start = time.monotonic()
+    if args.profile:
+        profile_util.run_profiled(np.update_news, "update_news", trace_memory=args.profile_memory)
+    else:
+        np.update_news()
+    log.info(f"News database updated in {time.monotonic() - start:.1f}s.")
+
+def main():
+    # parser
+    parser = setup_arg_parser()
+    args = parser.parse_args()
+    log_level = getattr(logging, args.log_level.upper(), logging.INFO)
+
+    # logging system
+    os.makedirs("logs", exist_ok=True)
+    setup_logging(log_level, filename="logs/scraper.log", json_format=args.log_json)
+
+    # Start metrics endpoint
+    if SCRAPER_METRICS_PORT is not None:
+        try:
+            metrics.start_metrics_thread(METRICS_HOST, SCRAPER_METRICS_PORT)
+        except OSError as e:
+            log.error(f"Failed to start metrics endpoint: {e}")
+
+    # Initialize database
+    db.init_db()
+
+    try:
+        while True:
+            try:
+                run_cycle(args)
+            except Exception as e:
+                log.error(f"Sync cycle failed: {e}", exc_info=True)
+
+            if args.once:
+                break
+            time.sleep(UPDATE_MINUTES * 60)
+    except KeyboardInterrupt:
+        log.info("Scraper shutting down.")
+
+
+if __name__ == "__main__":
+    main()
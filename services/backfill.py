@@ -0,0 +1,158 @@
+import json
+import logging
+
+import services.repost_queue as rq
+import services.subscriptions as subs
+
+from typing import List, Dict, Any, Optional
+
+log = logging.getLogger(__name__)
+
+# Historical backfill: a job copies the matching posts into backfill_queue, and the
+# Backfill cog promotes small chunks into repost only while no live news is pending.
+# All state lives in the DB, so an interrupted job resumes after a restart.
+
+def create_job(cursor, forum_channel_id: int, since: Optional[str] = None, until: Optional[str] = None,
+               tag_name: Optional[str] = None) -> tuple[int, int]:
+    # since / until are inclusive YYYY-MM-DD dates, compared against posted_news.timestamp
+    cursor.execute("""
+        INSERT INTO backfill_jobs (forum_channel_id, since, until, tag_name)
+        VALUES (?, ?, ?, ?)
+    """, (forum_channel_id, since, until, tag_name))
+    job_id = cursor.lastrowid
+
+    ## Skip posts already delivered, queued live, or queued by another job of this forum
+    cursor.execute(f"""
+        INSERT OR IGNORE INTO backfill_queue (job_id, post_id)
+        SELECT ?, p.post_id FROM posted_news p
+        WHERE (? IS NULL OR p.timestamp >= ?)
+          AND (? IS NULL OR p.timestamp < date(?, '+1 day'))
+          AND (? IS NULL OR p.post_id IN (
+                SELECT pt.post_id FROM post_tags pt JOIN tags t ON pt.tag_id = t.tag_id
+                WHERE t.tag_name = ?
+          ))
+          AND {subs.match_sql("?", "p.post_id")}
+          AND p.post_id NOT IN (SELECT post_id FROM forum_posted WHERE forum_channel_id = ?)
+          AND p.post_id NOT IN (SELECT post_id FROM repost WHERE forum_channel_id = ?)
+          AND p.post_id NOT IN (
+                SELECT q.post_id FROM backfill_queue q JOIN backfill_jobs j ON q.job_id = j.job_id
+                WHERE j.forum_channel_id = ?
+          )
+    """, (job_id, since, since, until, until, tag_name, tag_name, *[forum_channel_id] * 6))
+    total = max(cursor.rowcount, 0)
+
+    cursor.execute("""
+        UPDATE backfill_jobs SET total = ?, status = CASE WHEN ? = 0 THEN 'done' ELSE 'pending' END
+        WHERE job_id = ?
+    """, (total, total, job_id))
+    return job_id, total
+
+def finish_jobs(cursor) -> int:
+    # A job is done once nothing is left to promote and its forum has no backfill rows still
+    # in repost (waiting, failing or backing off)
+    cursor.execute("""
+        UPDATE backfill_jobs SET status = 'done'
+        WHERE status IN ('pending', 'running')
+          AND NOT EXISTS (SELECT 1 FROM backfill_queue q WHERE q.job_id = backfill_jobs.job_id)
+          AND NOT EXISTS (
+                SELECT 1 FROM repost r
+                WHERE r.forum_channel_id = backfill_jobs.forum_channel_id AND r.source = 'backfill'
+          )
+    """)
+    return max(cursor.rowcount, 0)
+
+def promote(cursor, limit: int, shard_count: Optional[int] = None, shard_ids: Optional[List[int]] = None) -> int:
+    finish_jobs(cursor)
+
+    # 1) Live news first: wait until this process has no live news due for delivery
+    if rq.has_pending(cursor, shard_count, shard_ids):
+        return 0
+
+    # 2) Oldest job first, oldest posts first
+    shard_sql, params = rq.shard_filter("j.forum_channel_id", shard_count, shard_ids)
+    cursor.execute(f"""
+        SELECT q.job_id, q.post_id, j.forum_channel_id
+        FROM backfill_queue q
+        JOIN backfill_jobs j ON q.job_id = j.job_id
+        JOIN posted_news p ON q.post_id = p.post_id
+        WHERE j.status IN ('pending', 'running'){shard_sql}
+        ORDER BY q.job_id ASC, p.timestamp ASC
+        LIMIT ?
+    """, (*params, limit))
+    rows = [tuple(r) for r in cursor.fetchall()]
+    if not rows:
+        return 0
+
+    # 3) Move the chunk into repost and record progress
+    cursor.executemany("INSERT OR IGNORE INTO repost (forum_channel_id, post_id, source) VALUES (?, ?, 'backfill')",
+                       [(forum_id, post_id) for _, post_id, forum_id in rows])
+    cursor.executemany("DELETE FROM backfill_queue WHERE job_id = ? AND post_id = ?",
+                       [(job_id, post_id) for job_id, post_id, _ in rows])
+    done: Dict[int, int] = {}
+    for job_id, _, _ in rows:
+        done[job_id] = done.get(job_id, 0) + 1
+    ## done counts promoted rows; list_jobs subtracts the ones not delivered yet
+    cursor.executemany("UPDATE backfill_jobs SET done = done + ?, status = 'running' WHERE job_id = ?",
+                       [(n, job_id) for job_id, n in done.items()])
+    return len(rows)
+
+def prune_unsubscribed(cursor, forum_channel_id: int) -> int:
+    # After a subscription change, drop queued posts the forum no longer wants
+    cursor.execute(f"""
+        DELETE FROM backfill_queue
+        WHERE job_id IN (SELECT job_id FROM backfill_jobs WHERE forum_channel_id = ?)
+          AND NOT {subs.match_sql("?", "backfill_queue.post_id")}
+    """, (forum_channel_id, *[forum_channel_id] * 3))
+    removed = max(cursor.rowcount, 0)
+    cursor.execute("""
+        UPDATE backfill_jobs
+        SET total = done + (SELECT COUNT(*) FROM backfill_queue q WHERE q.job_id = backfill_jobs.job_id)
+        WHERE forum_channel_id = ? AND status IN ('pending', 'running')
+    """, (forum_channel_id,))
+    finish_jobs(cursor)
+    return removed
+
+def cancel_forums(cursor, forum_channel_ids: List[int]) -> None:
+    # Called whenever forums are removed, so their queues do not linger
+    ids = json.dumps(list(forum_channel_ids))
+    cursor.execute("""
+        DELETE FROM backfill_queue
+        WHERE job_id IN (
+            SELECT job_id FROM backfill_jobs WHERE forum_channel_id IN (SELECT value FROM json_each(?))
+        )
+    """, (ids,))
+    cursor.execute("""
+        UPDATE backfill_jobs SET status = 'cancelled'
+        WHERE forum_channel_id IN (SELECT value FROM json_each(?)) AND status IN ('pending', 'running')
+    """, (ids,))
+
+def list_jobs(cursor, forum_channel_ids: List[int], limit: int = 10) -> List[Dict[str, Any]]:
+    if not forum_channel_ids:
+        return []
+    placeholders = ",".join("?" for _ in forum_channel_ids)
+    cursor.execute(f"""
+        SELECT job_id, forum_channel_id, since, until, tag_name, status, total, done, created_at
+        FROM backfill_jobs
+        WHERE forum_channel_id IN ({placeholders})
+        ORDER BY job_id DESC
+        LIMIT ?
+    """, (*forum_channel_ids, limit))
+    columns = [c[0] for c in cursor.description]
+    jobs = [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    ## Promoted rows still in repost are not delivered yet. repost does not record the job,
+    ## so a forum's rows are charged to its oldest unfinished jobs first (promotion order)
+    cursor.execute(f"""
+        SELECT forum_channel_id, COUNT(*) FROM repost
+        WHERE source = 'backfill' AND forum_channel_id IN ({placeholders})
+        GROUP BY forum_channel_id
+    """, forum_channel_ids)
+    in_flight = dict(cursor.fetchall())
+    for job in sorted(jobs, key=lambda j: j["job_id"]):
+        pending = 0
+        if job["status"] in ("pending", "running"):
+            pending = min(job["done"], in_flight.get(job["forum_channel_id"], 0))
+            in_flight[job["forum_channel_id"]] = in_flight.get(job["forum_channel_id"], 0) - pending
+        job["in_flight"] = pending
+        job["delivered"] = job["done"] - pending
+    return jobs
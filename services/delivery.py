@@ -0,0 +1,33 @@
+import discord
+
+from typing import Optional, Protocol
+from discord.ext import commands
+
+class DeliveryBackend(Protocol):
+    # 取得發文目標；Forum cog 只透過這層存取頻道，方便以 benchmarks/fake_discord.py 替換
+    def get_channel(self, channel_id: int) -> Optional[object]: ...
+
+    def get_forum(self, forum_id: int) -> Optional[discord.ForumChannel]: ...
+
+    async def get_thread(self, thread_id: int) -> Optional[discord.Thread]: ...
+
+class DiscordDelivery:
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+
+    def get_channel(self, channel_id: int):
+        return self.bot.get_channel(channel_id)
+
+    def get_forum(self, forum_id: int) -> Optional[discord.ForumChannel]:
+        channel = self.bot.get_channel(forum_id)
+        return channel if isinstance(channel, discord.ForumChannel) else None
+
+    async def get_thread(self, thread_id: int) -> Optional[discord.Thread]:
+        channel = self.bot.get_channel(thread_id)
+        if channel is None:
+            ## 已封存的討論串會從快取移除，改向 API 查詢；只有 NotFound 代表討論串真的不存在
+            try:
+                channel = await self.bot.fetch_channel(thread_id)
+            except discord.NotFound:
+                return None
+        return channel if isinstance(channel, discord.Thread) else None
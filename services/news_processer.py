@@ -1,9 +1,10 @@
 import logging
-import sqlite3
 import hashlib
-import services.scrape_web as sw
-
-from config.config import DB_PATH
+import utils.db_util as db
+import utils.content_util as cu
+import utils.metrics_util as metrics
+import services.post_render as pr
+import services.subscriptions as subs
 
 log = logging.getLogger(__name__)
 
@@ -27,10 +28,25 @@ def check_post_status(conn, item):
         return "UPDATE"
     return "NO_CHANGE"
 
+def sync_urls(cursor, table: str, column: str, post_id, urls: list[str]) -> bool:
+    # Diff against the stored set instead of delete-and-reinsert
+    cursor.execute(f"SELECT {column} FROM {table} WHERE post_id = ?", (post_id,))
+    existing = {r[0] for r in cursor.fetchall()}
+    wanted = set(urls)
+
+    removed = existing - wanted
+    added = [u for u in dict.fromkeys(urls) if u not in existing]
+    if removed:
+        cursor.executemany(f"DELETE FROM {table} WHERE post_id = ? AND {column} = ?", [(post_id, u) for u in removed])
+    if added:
+        cursor.executemany(f"INSERT INTO {table} (post_id, {column}) VALUES (?, ?)", [(post_id, u) for u in added])
+    return bool(removed or added)
+
 def insert_data(conn, item):
     cursor = conn.cursor()
     post_id = item.get("id")
     status = check_post_status(conn, item)
+    metrics.POST_STATUS.inc(status=status)
 
     if status == "NO_CHANGE":
         return
@@ -42,18 +58,21 @@ def insert_data(conn, item):
         cursor.execute("""
             INSERT INTO posted_news (post_id, title, url, content, content_hash, timestamp)
             VALUES (?, ?, ?, ?, ?, ?)
-        """, (post_id, item.get("title"), item.get("url"), item.get("content"), content_hash, item.get("timestamp")))
+        """, (post_id, item.get("title"), item.get("url"), cu.encode_content(item.get("content")), content_hash, item.get("timestamp")))
     else:
+        cursor.execute(f"SELECT {cu.content_sql('p')} FROM posted_news p WHERE p.post_id = ?", (post_id,))
+        previous_content = cursor.fetchone()[0]
+
         cursor.execute("""
             UPDATE posted_news
             SET title = ?, url = ?, content = ?, content_hash = ?, timestamp = ?
             WHERE post_id = ?
-        """, (item.get("title"), item.get("url"), item.get("content"), content_hash, item.get("timestamp"), post_id))
+        """, (item.get("title"), item.get("url"), cu.encode_content(item.get("content")), content_hash, item.get("timestamp"), post_id))
+        ## The new body is inline again
+        cursor.execute("DELETE FROM posted_news_archive WHERE post_id = ?", (post_id,))
 
-        # Remove existing tags, files, images for UPDATE
+        # Remove existing tags for UPDATE
         cursor.execute("DELETE FROM post_tags WHERE post_id = ?", (post_id,))
-        cursor.execute("DELETE FROM files WHERE post_id = ?", (post_id,))
-        cursor.execute("DELETE FROM images WHERE post_id = ?", (post_id,))
 
     # 2) tags
     tags = item.get("tags", [])
@@ -70,17 +89,41 @@ def insert_data(conn, item):
             """, (post_id, tag_id))
 
     # 3) files & images
-    for file_url in item.get("files", []):
-        cursor.execute("INSERT OR IGNORE INTO files (post_id, file_url) VALUES (?, ?)", (post_id, file_url))
-    
-    for image_url in item.get("images", []):
-        cursor.execute("INSERT OR IGNORE INTO images (post_id, image_url) VALUES (?, ?)", (post_id, image_url))
-
-    # 4) repost
-    cursor.execute("""
-        INSERT OR IGNORE INTO repost (forum_channel_id, post_id)
-        SELECT channel_id, ? FROM registered_forum
-    """, (post_id,))
+    files_changed = sync_urls(cursor, "files", "file_url", post_id, item.get("files", []))
+    images_changed = sync_urls(cursor, "images", "image_url", post_id, item.get("images", []))
+
+    # 3.5) Discord message rendered once for every forum (keyed on content_hash)
+    pr.store_rendered(cursor, post_id, content_hash, pr.render_post(
+        item.get("title"), item.get("url"), item.get("content"), item.get("timestamp"),
+        tags, item.get("images", []), item.get("files", []),
+    ))
+
+    # 3.6) previous version for UPDATE
+    if status == "UPDATE":
+        ## Keep the oldest undelivered version so the diff covers every change since the last delivery
+        cursor.execute("""
+            SELECT EXISTS (
+                SELECT 1 FROM repost r
+                JOIN forum_posted f ON r.forum_channel_id = f.forum_channel_id AND r.post_id = f.post_id
+                WHERE r.post_id = ?
+            )
+        """, (post_id,))
+        pending = cursor.fetchone()[0]
+        cursor.execute("""
+            INSERT INTO posted_news_history (post_id, content, attachments_changed)
+            VALUES (?, ?, ?)
+            ON CONFLICT (post_id) DO UPDATE SET
+                content = CASE WHEN ? THEN content ELSE excluded.content END,
+                attachments_changed = excluded.attachments_changed OR (? AND attachments_changed)
+        """, (post_id, previous_content, files_changed or images_changed, pending, pending))
+
+    # 4) repost, only for the forums subscribed to the post's tags
+    cursor.execute(f"""
+        INSERT INTO repost (forum_channel_id, post_id)
+        SELECT rf.channel_id, ? FROM registered_forum rf
+        WHERE {subs.match_sql("rf.channel_id", "?")}
+        ON CONFLICT (forum_channel_id, post_id) DO UPDATE SET source = 'live'
+    """, (post_id, post_id, post_id))
 
 def preprocess_content(item):
     title = item.get("title", "").strip()
@@ -95,15 +138,17 @@ def preprocess_content(item):
     return item
 
 def update_news():
-    # 1) Scrape all news
+    # 1) Scrape all news (bs4 and requests are loaded on the first sync, not at bot startup)
+    import services.scrape_web as sw
     all_items = sw.main()
     if not all_items: 
         return
     
+    store_news(all_items)
+
+def store_news(all_items):
     # 2) Connect to DB
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute("PRAGMA journal_mode=WAL;")
-    conn.execute("PRAGMA foreign_keys = ON;")
+    conn = db.connect()
 
     log.info(f"Updating {len(all_items)} news items to database...")
 
@@ -116,7 +161,8 @@ def update_news():
                 ## TODO: Use LLMs to rewrite content or summarize content
                 ## 4) Insert or update data
                 if isinstance(item, dict):
-                    insert_data(conn, item)
+                    with metrics.STAGE_SECONDS.time(stage="db_upsert"):
+                        insert_data(conn, item)
                     ok += 1
                 else:
                     log.warning(f"Invalid item format: {item}")
@@ -0,0 +1,68 @@
+import json
+import logging
+
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from typing import List, Dict, Any, Optional
+
+log = logging.getLogger(__name__)
+
+TAIPEI_TZ = ZoneInfo("Asia/Taipei")
+
+FILE_LINKS_HEADER = "\n📂 附加檔案連結：\n"
+MAX_CONTENT_LENGTH = 1800
+MAX_MESSAGE_LENGTH = 2000
+MAX_TITLE_LENGTH = 100
+MAX_UPLOAD_IMAGES = 10
+
+# Rendering shared by ingest (news_processer fills rendered_posts) and the Forum cog,
+# so both always produce the same Discord message for a post
+
+def parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value).replace(tzinfo=TAIPEI_TZ) if value else None
+
+def render_body(content: Optional[str], url: Optional[str], timestamp: Any) -> str:
+    ## Timestamp <t:TIMESTAMP:F>
+    if hasattr(timestamp, "timestamp"):
+        discord_ts = f"<t:{int(timestamp.timestamp())}:F>"
+    else:
+        discord_ts = str(timestamp)
+
+    return (
+        f"{(content or '')[:MAX_CONTENT_LENGTH]}\n\n"
+        f"{'='*30}\n"
+        f"📌 原文連結：{url or ''}\n📅 發文時間：{discord_ts}"
+    )
+
+def append_file_links(body: str, large_file_links: List[str]) -> str:
+    # Links of attachments that could not be uploaded are only known after downloading
+    if large_file_links:
+        body += FILE_LINKS_HEADER + "\n".join([f"- {link}" for link in large_file_links])
+    return body[:MAX_MESSAGE_LENGTH]
+
+def render_post(title: Optional[str], url: Optional[str], content: Optional[str], timestamp: Optional[str],
+                tags: List[str], image_urls: List[str], file_urls: List[str]) -> Dict[str, Any]:
+    return {
+        "title": (title or "無標題")[:MAX_TITLE_LENGTH],
+        "body": render_body(content, url, parse_timestamp(timestamp)),
+        "manifest": {
+            "tags": list(tags),
+            "images": list(image_urls)[:MAX_UPLOAD_IMAGES],
+            "files": list(file_urls),
+        },
+    }
+
+def store_rendered(cursor, post_id: int, content_hash: str, rendered: Dict[str, Any]) -> None:
+    cursor.execute("""
+        INSERT INTO rendered_posts (post_id, content_hash, title, body, manifest)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (post_id) DO UPDATE SET
+            content_hash = excluded.content_hash,
+            title = excluded.title,
+            body = excluded.body,
+            manifest = excluded.manifest
+    """, (post_id, content_hash, rendered["title"], rendered["body"], json.dumps(rendered["manifest"], ensure_ascii=False)))
+
+def load_manifest(value: Optional[str]) -> Dict[str, List[str]]:
+    manifest = json.loads(value) if value else {}
+    return {key: manifest.get(key, []) for key in ("tags", "images", "files")}
@@ -0,0 +1,145 @@
+import json
+import logging
+
+import utils.content_util as cu
+import services.post_render as pr
+
+from typing import List, Dict, Any, Optional
+from config.config import REPOST_RETRY_SECONDS, REPOST_RETRY_MAX_SECONDS
+
+log = logging.getLogger(__name__)
+
+def get_posts_additional_info(cursor, post_ids: set) -> Dict[int, Any]:
+    info = {}
+    for p_id in post_ids:
+        tags = [r[0] for r in cursor.execute("SELECT t.tag_name FROM tags t JOIN post_tags pt ON t.tag_id = pt.tag_id WHERE pt.post_id = ?", (p_id,)).fetchall()]
+        imgs = [r[0] for r in cursor.execute("SELECT image_url FROM images WHERE post_id = ?", (p_id,)).fetchall()]
+        files = [r[0] for r in cursor.execute("SELECT file_url FROM files WHERE post_id = ?", (p_id,)).fetchall()]
+        info[p_id] = {"tags": tags, "image_urls": imgs, "file_urls": files}
+    return info
+
+def render_stale(cursor, rows) -> Dict[int, Dict[str, Any]]:
+    # rendered_posts is filled at ingest; posts stored before it existed (or whose
+    # content_hash moved on) are rendered here once and stored for the other forums
+    stale = {row['post_id'] for row in rows if row['rendered_hash'] != row['content_hash']}
+    if not stale:
+        return {}
+
+    posts_info = get_posts_additional_info(cursor, stale)
+    rendered = {}
+    for p_id in stale:
+        cursor.execute(f"SELECT title, url, {cu.content_sql('p')}, content_hash, timestamp FROM posted_news p WHERE post_id = ?", (p_id,))
+        title, url, content, content_hash, timestamp = cursor.fetchone()
+        info = posts_info.get(p_id, {})
+        rendered[p_id] = pr.render_post(
+            title, url, cu.decode_content(content), timestamp,
+            info.get("tags", []), info.get("image_urls", []), info.get("file_urls", []),
+        )
+        pr.store_rendered(cursor, p_id, content_hash, rendered[p_id])
+    cursor.connection.commit()
+    log.info(f"Rendered {len(stale)} posts missing from rendered_posts.")
+    return rendered
+
+def build_post_data(row, rendered: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    if rendered is None:
+        rendered = {"title": row['rendered_title'], "body": row['body'], "manifest": pr.load_manifest(row['manifest'])}
+    manifest = rendered["manifest"]
+    return {
+        "url": row['url'],
+        "title": rendered["title"],
+        "body": rendered["body"],
+        ## Full content is only needed for the diff of updates
+        "content": cu.decode_content(row['content']),
+        "tags": manifest["tags"],
+        "images_url": manifest["images"],
+        "files_url": manifest["files"],
+        "previous_content": cu.decode_content(row['previous_content']),
+        "attachments_changed": row['attachments_changed'] != 0,
+    }
+
+def shard_filter(column: str, shard_count: Optional[int] = None, shard_ids: Optional[List[int]] = None) -> tuple[str, list]:
+    # With shard_ids, only forums whose guild belongs to one of these shards match
+    # (Discord assigns a guild to shard (guild_id >> 22) % shard_count)
+    if shard_ids is None or not shard_count:
+        return "", []
+    sql = f"""
+          AND {column} IN (
+            SELECT channel_id FROM registered_forum
+            WHERE (guild_id >> 22) % ? IN (SELECT value FROM json_each(?))
+          )"""
+    return sql, [shard_count, json.dumps(list(shard_ids))]
+
+# Rows due for delivery: published, and not waiting for a retry after a failure
+DUE_SQL = "p.timestamp <= datetime('now') AND (r.retry_at IS NULL OR r.retry_at <= datetime('now'))"
+
+def has_pending(cursor, shard_count: Optional[int] = None, shard_ids: Optional[List[int]] = None,
+                live_only: bool = True) -> bool:
+    # Rows fetch_batch would deliver now. Live only: gives live news priority over backfill,
+    # rows backing off after a failure do not hold backfill back
+    shard_sql, params = shard_filter("r.forum_channel_id", shard_count, shard_ids)
+    source_sql = "r.source = 'live' AND " if live_only else ""
+    cursor.execute(f"""
+        SELECT 1 FROM repost r
+        JOIN posted_news p ON r.post_id = p.post_id
+        WHERE {source_sql}{DUE_SQL}{shard_sql}
+        LIMIT 1
+    """, params)
+    return cursor.fetchone() is not None
+
+def mark_failed(cursor, forum_channel_id: int, post_id: int) -> None:
+    # Exponential backoff, so a forum the bot cannot post to does not retry every batch
+    cursor.execute("""
+        UPDATE repost
+        SET attempts = attempts + 1,
+            retry_at = datetime('now', '+' || MIN(? * (1 << MIN(attempts, 16)), ?) || ' seconds')
+        WHERE forum_channel_id = ? AND post_id = ?
+    """, (REPOST_RETRY_SECONDS, REPOST_RETRY_MAX_SECONDS, forum_channel_id, post_id))
+
+def fetch_batch(cursor, limit: int = 50, shard_count: Optional[int] = None, shard_ids: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+    # cursor must come from a connection with row_factory = sqlite3.Row
+    shard_sql, params = shard_filter("r.forum_channel_id", shard_count, shard_ids)
+
+    # 1) Get repost tasks (live before backfill, new posts before updates, oldest first) with their rendered message
+    cursor.execute(f"""
+        SELECT
+            r.forum_channel_id,
+            r.post_id,
+            p.url,
+            p.content_hash,
+            CASE WHEN f.dc_thread_id IS NOT NULL THEN p.content END AS content,
+            f.dc_thread_id,
+            h.content AS previous_content,
+            h.attachments_changed,
+            rp.content_hash AS rendered_hash,
+            rp.title AS rendered_title,
+            rp.body,
+            rp.manifest
+        FROM repost r
+        JOIN posted_news p ON r.post_id = p.post_id
+        LEFT JOIN rendered_posts rp ON r.post_id = rp.post_id
+        LEFT JOIN forum_posted f ON r.forum_channel_id = f.forum_channel_id AND r.post_id = f.post_id
+        LEFT JOIN posted_news_history h ON f.dc_thread_id IS NOT NULL AND r.post_id = h.post_id
+        WHERE {DUE_SQL}{shard_sql}
+        ORDER BY
+            (r.source = 'backfill') ASC,
+            (f.dc_thread_id IS NOT NULL) ASC,
+            p.timestamp ASC
+        LIMIT ?
+    """, (*params, limit))
+    rows = cursor.fetchall()
+    if not rows:
+        return []
+
+    # 2) Render posts without an up-to-date rendered_posts row
+    rendered = render_stale(cursor, rows)
+
+    # 3) Assemble delivery tasks
+    return [
+        {
+            "forum_channel_id": row['forum_channel_id'],
+            "post_id": row['post_id'],
+            "dc_thread_id": row['dc_thread_id'],
+            "post": build_post_data(row, rendered.get(row['post_id'])),
+        }
+        for row in rows
+    ]
@@ -0,0 +1,135 @@
+import json
+import logging
+import time
+
+from contextlib import closing
+from typing import List, Dict, Optional
+
+import services.backfill as backfill
+import services.subscriptions as subs
+import utils.db_util as db
+import utils.image_util as image_util
+
+from config.config import (
+    RETENTION_CONTENT_DAYS,
+    RETENTION_JOB_DAYS,
+    RETENTION_VACUUM_PAGES,
+    IMAGE_CACHE_MAX_AGE_DAYS,
+)
+
+log = logging.getLogger(__name__)
+
+# Retention keeps the tables that the scheduler touches small: old post bodies move to
+# posted_news_archive, rows that nothing refers to anymore are deleted, and the freed pages
+# are handed back with incremental vacuum. Nothing a forum still needs is removed.
+
+ARCHIVE_BATCH_SIZE = 500
+
+def remove_forums(cursor, forum_channel_ids: List[int], keep_posted: bool = False) -> None:
+    # One statement per table for any number of forums. /remove_forum keeps forum_posted,
+    # so adding the forum again neither backfills nor duplicates the existing threads
+    ids = json.dumps(list(forum_channel_ids))
+    cursor.execute("DELETE FROM registered_forum WHERE channel_id IN (SELECT value FROM json_each(?))", (ids,))
+    cursor.execute("DELETE FROM repost WHERE forum_channel_id IN (SELECT value FROM json_each(?))", (ids,))
+    if not keep_posted:
+        cursor.execute("DELETE FROM forum_posted WHERE forum_channel_id IN (SELECT value FROM json_each(?))", (ids,))
+    backfill.cancel_forums(cursor, forum_channel_ids)
+    subs.clear(cursor, forum_channel_ids)
+
+def archive_content(conn, days: int, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    # Move bodies of posts older than `days` out of posted_news. Queued posts stay inline;
+    # their rendered_posts rows are dropped and rebuilt from the archive if ever needed
+    archived = 0
+    while True:
+        rows = conn.execute("""
+            SELECT p.post_id FROM posted_news p
+            WHERE p.content IS NOT NULL
+              AND p.timestamp < strftime('%Y-%m-%dT%H:%M:%SZ', 'now', ?)
+              AND NOT EXISTS (SELECT 1 FROM repost r WHERE r.post_id = p.post_id)
+              AND NOT EXISTS (SELECT 1 FROM backfill_queue q WHERE q.post_id = p.post_id)
+            LIMIT ?
+        """, (f"-{days} days", batch_size)).fetchall()
+        if not rows:
+            break
+
+        ids = json.dumps([r[0] for r in rows])
+        ## Archive row first: the FTS update trigger reads the body from there
+        conn.execute("""
+            INSERT OR REPLACE INTO posted_news_archive (post_id, content)
+            SELECT post_id, content FROM posted_news WHERE post_id IN (SELECT value FROM json_each(?))
+        """, (ids,))
+        conn.execute("UPDATE posted_news SET content = NULL WHERE post_id IN (SELECT value FROM json_each(?))", (ids,))
+        conn.execute("DELETE FROM rendered_posts WHERE post_id IN (SELECT value FROM json_each(?))", (ids,))
+        conn.commit()
+        archived += len(rows)
+    return archived
+
+def prune_orphans(cursor, job_days: int) -> Dict[str, int]:
+    # (name, statement) pairs; each deletes rows whose owner is gone or that are no longer used
+    statements = [
+        ("post_tags", "DELETE FROM post_tags WHERE post_id NOT IN (SELECT post_id FROM posted_news)"),
+        ("files", "DELETE FROM files WHERE post_id NOT IN (SELECT post_id FROM posted_news)"),
+        ("images", "DELETE FROM images WHERE post_id NOT IN (SELECT post_id FROM posted_news)"),
+        ("rendered_posts", "DELETE FROM rendered_posts WHERE post_id NOT IN (SELECT post_id FROM posted_news)"),
+        ("posted_news_archive", """
+            DELETE FROM posted_news_archive
+            WHERE post_id NOT IN (SELECT post_id FROM posted_news WHERE content IS NULL)
+        """),
+        ## Previous versions are only read while an update is still queued
+        ("posted_news_history", "DELETE FROM posted_news_history WHERE post_id NOT IN (SELECT post_id FROM repost)"),
+        ("tags", """
+            DELETE FROM tags
+            WHERE tag_id NOT IN (SELECT tag_id FROM post_tags)
+              AND tag_name NOT IN (SELECT tag_name FROM forum_subscriptions)
+        """),
+        ("repost", "DELETE FROM repost WHERE forum_channel_id NOT IN (SELECT channel_id FROM registered_forum)"),
+        ("forum_subscriptions", """
+            DELETE FROM forum_subscriptions WHERE forum_channel_id NOT IN (SELECT channel_id FROM registered_forum)
+        """),
+        ("backfill_queue", """
+            DELETE FROM backfill_queue
+            WHERE job_id NOT IN (SELECT job_id FROM backfill_jobs WHERE status IN ('pending', 'running'))
+        """),
+    ]
+    removed = {}
+    for name, sql in statements:
+        cursor.execute(sql)
+        removed[name] = max(cursor.rowcount, 0)
+
+    cursor.execute("""
+        DELETE FROM backfill_jobs
+        WHERE status IN ('done', 'cancelled') AND created_at < datetime('now', ?)
+    """, (f"-{job_days} days",))
+    removed["backfill_jobs"] = max(cursor.rowcount, 0)
+    return {name: n for name, n in removed.items() if n}
+
+def incremental_vacuum(conn, pages: Optional[int] = None) -> int:
+    # Needs auto_vacuum=INCREMENTAL (set by init_db); returns the number of pages freed
+    free_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    if not free_before:
+        return 0
+    ## Every step of the pragma frees one page, so the result has to be read to the end
+    conn.execute(f"PRAGMA incremental_vacuum({int(pages or 0)})").fetchall()
+    return free_before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+def run_retention() -> Dict[str, int]:
+    start = time.monotonic()
+    stats: Dict[str, int] = {}
+
+    with closing(db.connect(timeout=30)) as conn:
+        # 1) Archive old bodies
+        if RETENTION_CONTENT_DAYS:
+            stats["archived"] = archive_content(conn, RETENTION_CONTENT_DAYS)
+
+        # 2) Orphans and finished backfill jobs
+        stats.update(prune_orphans(conn.cursor(), RETENTION_JOB_DAYS))
+        conn.commit()
+
+        # 3) Give free pages back to the filesystem
+        stats["freed_pages"] = incremental_vacuum(conn, RETENTION_VACUUM_PAGES)
+
+    # 4) Image cache
+    stats["image_cache"] = image_util.prune_cache(IMAGE_CACHE_MAX_AGE_DAYS)
+
+    log.info(f"Retention finished in {time.monotonic() - start:.1f}s: {stats}")
+    return stats
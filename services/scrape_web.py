@@ -1,16 +1,73 @@
 import json
 import os
 import re
+import time
 import logging
 
 from typing import List, Dict, Any, Optional
 from urllib.parse import urljoin
 from bs4 import BeautifulSoup
 
-from config.config import BASE_URL, WP_API_BASE, CATEGORY_URLS, SESSION
+import utils.circuit_breaker as cb
+import utils.metrics_util as metrics
+
+from config.config import BASE_URL, WP_API_BASE, CATEGORY_URLS, HTTP_HEADERS
 
 log = logging.getLogger(__name__)
 
+_session = None
+
+def get_session():
+    # requests is only imported once a sync actually runs
+    global _session
+    if _session is None:
+        import requests
+        _session = requests.Session()
+        _session.headers.update(HTTP_HEADERS)
+    return _session
+
+def request(method: str, url: str, **kwargs):
+    # Every request to the site goes through the host's circuit breaker
+    import requests
+
+    breaker = cb.get(url)
+    breaker.check()
+    start = time.monotonic()
+    try:
+        r = get_session().request(method, url, **kwargs)
+    except requests.RequestException as e:
+        breaker.record_failure(time.monotonic() - start, reason=type(e).__name__)
+        raise
+    except BaseException:
+        ## Not the host's fault (cancelled, bug): only give the probe slot back
+        breaker.release()
+        raise
+
+    latency = time.monotonic() - start
+    if r.status_code == 429 or r.status_code >= 500:
+        breaker.record_failure(latency, reason=f"HTTP {r.status_code}")
+    else:
+        breaker.record_success(latency)
+    return r
+
+def probe_site() -> bool:
+    # After the circuit opened, one cheap request decides whether a full crawl is worth it
+    import requests
+
+    breaker = cb.get(WP_API_BASE)
+    if breaker.state == cb.CLOSED:
+        return True
+    try:
+        r = request("GET", f"{WP_API_BASE}/posts", params={"per_page": 1, "_fields": "id"}, timeout=10)
+        r.raise_for_status()
+    except cb.CircuitOpenError as e:
+        log.warning(f"Skipping this sync: {e}")
+        return False
+    except requests.RequestException as e:
+        log.warning(f"Site probe failed, skipping this sync: {e}")
+        return False
+    return breaker.state == cb.CLOSED
+
 def ensure_parent_dir(path: str) -> None:
     parent = os.path.dirname(path)
     if parent:
@@ -41,7 +98,7 @@ def extract_img_urls_from_html(html: str) -> List[str]:
     return unique_keep_order(imgs)
 
 def get_category_id_from_header(category_page_url: str) -> Optional[int]:
-    r = SESSION.head(category_page_url, timeout=20, allow_redirects=True)
+    r = request("HEAD", category_page_url, timeout=20, allow_redirects=True)
     link = r.headers.get("Link", "") or r.headers.get("link", "")
     m = re.search(r"/wp/v2/categories/(\d+)", link)
     return int(m.group(1)) if m else None
@@ -49,7 +106,7 @@ def get_category_id_from_header(category_page_url: str) -> Optional[int]:
 def get_category_name(cat_id: int, cache: Dict[int, str]) -> str:
     if cat_id in cache:
         return cache[cat_id]
-    r = SESSION.get(f"{WP_API_BASE}/categories/{cat_id}", timeout=25)
+    r = request("GET", f"{WP_API_BASE}/categories/{cat_id}", timeout=25)
     r.raise_for_status()
     name = r.json().get("name") or str(cat_id)
     cache[cat_id] = name
@@ -61,11 +118,16 @@ def fetch_posts_by_category(cat_id: int) -> List[Dict[str, Any]]:
     per_page = 100
 
     while True:
-        r = SESSION.get(
-            f"{WP_API_BASE}/posts",
-            params={"categories": cat_id, "per_page": per_page, "page": page, "_embed": 1},
-            timeout=30,
-        )
+        with metrics.STAGE_SECONDS.time(stage="page_fetch"):
+            r = request(
+                "GET",
+                f"{WP_API_BASE}/posts",
+                params={"categories": cat_id, "per_page": per_page, "page": page, "_embed": 1},
+                timeout=30,
+            )
+
+        if r.status_code == 429:
+            metrics.RATE_LIMITED.inc(target="csie")
 
         if r.status_code == 400 and "rest_post_invalid_page_number" in r.text:
             break
@@ -95,19 +157,92 @@ def upsert(db: List[Dict[str, Any]], item: Dict[str, Any]) -> List[Dict[str, Any
         db.append(item)
     return db
 
+def parse_post(p: Dict[str, Any], cat_name_cache: Dict[int, str]) -> Dict[str, Any]:
+    post_id = str(p.get("id"))
+    url = p.get("link")
+
+    title_html = (p.get("title") or {}).get("rendered") or ""
+    title = BeautifulSoup(title_html, "html.parser").get_text(strip=True)
+
+    content_html = (p.get("content") or {}).get("rendered") or ""
+    content = html_to_text(content_html)
+
+    date_gmt = p.get("date_gmt")
+    timestamp = None
+    if date_gmt:
+        timestamp = date_gmt if date_gmt.endswith("Z") else (date_gmt + "Z")
+
+    # Tags
+    raw_tags = []
+    for cid in p.get("categories", []):
+        name = get_category_name(int(cid), cat_name_cache)
+        if name:
+            raw_tags.append(name.strip())
+
+    ## Remove undesired tags
+    EXCLUDED_TAGS = {"最新消息", "Uncategorized", "未分類"}
+    filtered_tags = [t for t in raw_tags if t not in EXCLUDED_TAGS]
+
+    ## Keep unique and order
+    tags = unique_keep_order(filtered_tags)
+
+    files = []
+    embedded = p.get("_embedded", {})
+    fm = embedded.get("wp:featuredmedia")
+    if isinstance(fm, list) and fm:
+        src = fm[0].get("source_url")
+        if src:
+            files.append(urljoin(BASE_URL, src.strip()))
+    files.extend(extract_img_urls_from_html(content_html))
+    files = unique_keep_order(files)
+
+    images = []
+    for f in files:
+        if re.search(r"\.(jpg|jpeg|png|gif|bmp|webp)(\?|$)", f, re.IGNORECASE):
+            images.append(f)
+            files.remove(f)
+
+    return {
+        "id": post_id,     
+        "url": url,
+        "title": title,
+        "tags": tags,
+        "content": content,
+        "images": images,
+        "files": files,
+        "timestamp": timestamp,
+        "posted": [],      
+    }
+
 def main():
     # db = load_db(JSON_PATH)
+    import requests
+
+    ## A failing request skips its category only; the other categories are still returned.
+    ## Once the circuit opens, the remaining categories are skipped without waiting on the site
+    fetch_errors = (requests.RequestException, ValueError, cb.CircuitOpenError)
+
+    if not probe_site():
+        return
 
     cat_name_cache: Dict[int, str] = {}
 
     cat_ids: List[int] = []
     for url in CATEGORY_URLS:
-        cat_id = get_category_id_from_header(url)
-        if cat_id is None:
-            # print(f"[Skip] not a category page (cannot parse category id): {url}")
-            log.warning(f"Not a category page (cannot parse category id): {url}")
-            continue
-        name = get_category_name(cat_id, cat_name_cache)
+        with metrics.STAGE_SECONDS.time(stage="category_fetch"):
+            try:
+                cat_id = get_category_id_from_header(url)
+                if cat_id is None:
+                    # print(f"[Skip] not a category page (cannot parse category id): {url}")
+                    log.warning(f"Not a category page (cannot parse category id): {url}")
+                    continue
+                name = get_category_name(cat_id, cat_name_cache)
+            except cb.CircuitOpenError as e:
+                log.warning(f"Stop resolving categories: {e}")
+                break
+            except fetch_errors as e:
+                log.warning(f"Cannot resolve category {url}: {e}")
+                continue
         log.info(f"Found category: {name} (id={cat_id}) from {url}")
         cat_ids.append(cat_id)
 
@@ -118,68 +253,30 @@ def main():
         return
 
     all_items_map: Dict[str, Dict[str, Any]] = {}
+    failed: List[str] = []
 
     for cat_id in cat_ids:
         cat_name = get_category_name(cat_id, cat_name_cache)
-        posts = fetch_posts_by_category(cat_id)
+        try:
+            posts = fetch_posts_by_category(cat_id)
+        except fetch_errors as e:
+            log.warning(f"Cannot fetch category {cat_name} (id={cat_id}): {e}")
+            failed.append(cat_name)
+            continue
         log.info(f"Fetched {len(posts)} posts from category: {cat_name} (id={cat_id})")
 
         for p in posts:
-            post_id = str(p.get("id"))
-            url = p.get("link")
-
-            title_html = (p.get("title") or {}).get("rendered") or ""
-            title = BeautifulSoup(title_html, "html.parser").get_text(strip=True)
-
-            content_html = (p.get("content") or {}).get("rendered") or ""
-            content = html_to_text(content_html)
-
-            date_gmt = p.get("date_gmt")
-            timestamp = None
-            if date_gmt:
-                timestamp = date_gmt if date_gmt.endswith("Z") else (date_gmt + "Z")
-
-            # Tags
-            raw_tags = []
-            for cid in p.get("categories", []):
-                name = get_category_name(int(cid), cat_name_cache)
-                if name:
-                    raw_tags.append(name.strip())
-
-            ## Remove undesired tags
-            EXCLUDED_TAGS = {"最新消息", "Uncategorized", "未分類"}
-            filtered_tags = [t for t in raw_tags if t not in EXCLUDED_TAGS]
-
-            ## Keep unique and order
-            tags = unique_keep_order(filtered_tags)
-
-            files = []
-            embedded = p.get("_embedded", {})
-            fm = embedded.get("wp:featuredmedia")
-            if isinstance(fm, list) and fm:
-                src = fm[0].get("source_url")
-                if src:
-                    files.append(urljoin(BASE_URL, src.strip()))
-            files.extend(extract_img_urls_from_html(content_html))
-            files = unique_keep_order(files)
-
-            images = []
-            for f in files:
-                if re.search(r"\.(jpg|jpeg|png|gif|bmp|webp)(\?|$)", f, re.IGNORECASE):
-                    images.append(f)
-                    files.remove(f)
-
-            all_items_map[post_id] = {
-                "id": post_id,     
-                "url": url,
-                "title": title,
-                "tags": tags,
-                "content": content,
-                "images": images,
-                "files": files,
-                "timestamp": timestamp,
-                "posted": [],      
-            }
+            with metrics.STAGE_SECONDS.time(stage="parse"):
+                try:
+                    item = parse_post(p, cat_name_cache)
+                except fetch_errors as e:
+                    ## Tag names of unknown categories could not be fetched; retried next sync
+                    log.warning(f"Cannot parse post {p.get('id')}: {e}")
+                    continue
+            all_items_map[item["id"]] = item
+
+    if failed:
+        log.warning(f"Partial sync, skipped categories: {', '.join(failed)}")
 
     if not all_items_map:
         log.warning("No posts fetched from any category.")
@@ -189,8 +286,36 @@ def main():
 
 
 if __name__ == "__main__":
-    all_item = main()
-    log.info(f"Total fetched items: {len(all_item)}")
-    for item in all_item[:3]:
-        print(json.dumps(item, ensure_ascii=False, indent=2))
-    
\ No newline at end of file
+    import argparse
+    import utils.profile_util as profile_util
+
+    from utils.log_util import setup_logging
+
+    parser = argparse.ArgumentParser(description="Scrape NTNU CSIE news once")
+    parser.add_argument("--log-level", type=str, default="INFO", help="Console logging level")
+    parser.add_argument("--profile", action="store_true", help="Profile the run and write a report to logs/")
+    parser.add_argument("--profile-memory", action="store_true", help="With --profile, also trace memory")
+    parser.add_argument("--store", action="store_true", help="Also store the results (news_processer.update_news)")
+    args = parser.parse_args()
+
+    os.makedirs("logs", exist_ok=True)
+    setup_logging(getattr(logging, args.log_level.upper(), logging.INFO))
+
+    if args.store:
+        import services.news_processer as np
+        import utils.db_util as db
+
+        db.init_db()
+        func, label = np.update_news, "update_news"
+    else:
+        func, label = main, "scrape_web"
+
+    if args.profile:
+        all_item = profile_util.run_profiled(func, label, trace_memory=args.profile_memory)
+    else:
+        all_item = func()
+
+    if not args.store:
+        log.info(f"Total fetched items: {len(all_item or [])}")
+        for item in (all_item or [])[:3]:
+            print(json.dumps(item, ensure_ascii=False, indent=2))
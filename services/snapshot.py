@@ -0,0 +1,155 @@
+import gzip
+import json
+import logging
+import sqlite3
+import time
+
+from contextlib import closing
+from datetime import datetime
+
+import utils.content_util as cu
+import utils.db_util as db
+
+log = logging.getLogger(__name__)
+
+# Snapshot of the news archive, so a new deployment does not have to crawl the whole site.
+# gzip-compressed JSONL: a header line with the columns of each table, then one
+# ["table", value, ...] array per row. Content is stored decoded, so a snapshot does not
+# depend on the compression dictionaries of the database it came from.
+
+SNAPSHOT_FORMAT = "ntnucsie-news-snapshot"
+SNAPSHOT_VERSION = 1
+
+# Parents before children, the import inserts in this order
+SNAPSHOT_TABLES = {
+    "posted_news": ("post_id", "title", "url", "content", "content_hash", "timestamp"),
+    "tags": ("tag_id", "tag_name"),
+    "post_tags": ("post_id", "tag_id"),
+    "files": ("file_id", "post_id", "file_url"),
+    "images": ("image_id", "post_id", "image_url"),
+}
+
+IMPORT_BATCH_SIZE = 1000
+
+def export_snapshot(path: str) -> dict[str, int]:
+    start = time.monotonic()
+    counts = {table: 0 for table in SNAPSHOT_TABLES}
+
+    with closing(db.connect()) as conn, gzip.open(path, "wt", encoding="utf-8") as f:
+        ## One read transaction, so the tables are consistent with each other
+        conn.execute("BEGIN")
+        header = {
+            "format": SNAPSHOT_FORMAT,
+            "version": SNAPSHOT_VERSION,
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "tables": {table: list(columns) for table, columns in SNAPSHOT_TABLES.items()},
+        }
+        f.write(json.dumps(header, ensure_ascii=False) + "\n")
+
+        for table, columns in SNAPSHOT_TABLES.items():
+            ## Bodies moved to posted_news_archive by retention are exported inline
+            select = [cu.content_sql(table) if c == "content" else c for c in columns]
+            rows = conn.execute(f"SELECT {', '.join(select)} FROM {table} ORDER BY {columns[0]}")
+            for row in rows:
+                if table == "posted_news":
+                    row = (*row[:3], cu.decode_content(row[3]), *row[4:])
+                f.write(json.dumps([table, *row], ensure_ascii=False) + "\n")
+                counts[table] += 1
+        conn.rollback()
+
+    log.info(f"Exported snapshot to {path} in {time.monotonic() - start:.1f}s: {counts}")
+    return counts
+
+def _read_snapshot(f):
+    header = json.loads(f.readline() or "{}")
+    if header.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError("Not a news snapshot file.")
+    if header.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version: {header.get('version')}")
+    for table, columns in header["tables"].items():
+        if tuple(columns) != SNAPSHOT_TABLES.get(table):
+            raise ValueError(f"Unexpected columns for table {table}: {columns}")
+
+    for line in f:
+        table, *values = json.loads(line)
+        yield table, values
+
+def import_snapshot(path: str) -> dict[str, int]:
+    start = time.monotonic()
+    counts = {table: 0 for table in SNAPSHOT_TABLES}
+    statements = {
+        table: f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})"
+        for table, columns in SNAPSHOT_TABLES.items()
+    }
+
+    db.init_db()
+    with closing(db.connect()) as conn, gzip.open(path, "rt", encoding="utf-8") as f:
+        # 1) Only into an empty archive; ids in the snapshot would clash with existing rows
+        for table in SNAPSHOT_TABLES:
+            if conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone():
+                raise RuntimeError(f"Table {table} is not empty, import into a new database.")
+
+        ## foreign_keys can only be switched outside a transaction; checked once at the end
+        conn.execute("PRAGMA foreign_keys = OFF")
+        cursor = conn.cursor()
+        cursor.execute("BEGIN")
+        try:
+            # 2) No per-row FTS updates while loading, the index is built once afterwards
+            db.drop_fts_triggers(cursor)
+
+            # 3) Bulk insert in batches
+            batch_table, batch = None, []
+            for table, values in _read_snapshot(f):
+                if table != batch_table or len(batch) >= IMPORT_BATCH_SIZE:
+                    if batch:
+                        cursor.executemany(statements[batch_table], batch)
+                    batch_table, batch = table, []
+                batch.append(values)
+                counts[table] += 1
+            if batch:
+                cursor.executemany(statements[batch_table], batch)
+
+            cursor.execute("PRAGMA foreign_key_check")
+            if cursor.fetchone() is not None:
+                raise RuntimeError("Snapshot has rows referencing missing posts or tags.")
+
+            # 4) Compress content (trains a dictionary on the imported news), then index it.
+            #    Forced: init_db already recorded the format for the empty database
+            cu.migrate_content(conn, force=True)
+            db.rebuild_fts(cursor)
+            db.create_fts_triggers(cursor)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            conn.execute("PRAGMA foreign_keys = ON")
+
+    ## rendered_posts is filled lazily by repost_queue.render_stale when a post is delivered
+    log.info(f"Imported snapshot {path} in {time.monotonic() - start:.1f}s: {counts}")
+    return counts
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+
+    from utils.log_util import setup_logging
+
+    parser = argparse.ArgumentParser(description="Export or import a snapshot of the news archive")
+    parser.add_argument("action", choices=["export", "import"], help="export the database to PATH, or import PATH")
+    parser.add_argument("path", help="Snapshot file (.jsonl.gz)")
+    parser.add_argument("--log-level", type=str, default="INFO", help="Console logging level")
+    args = parser.parse_args()
+
+    os.makedirs("logs", exist_ok=True)
+    setup_logging(getattr(logging, args.log_level.upper(), logging.INFO))
+
+    if args.action == "export":
+        export_snapshot(args.path)
+    else:
+        try:
+            import_snapshot(args.path)
+        except (ValueError, RuntimeError, sqlite3.Error) as e:
+            log.error(f"Import failed: {e}")
+            raise SystemExit(1)
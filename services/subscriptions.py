@@ -0,0 +1,61 @@
+import json
+import logging
+
+from typing import List
+
+log = logging.getLogger(__name__)
+
+# Per-forum tag subscriptions. A forum without rows in forum_subscriptions gets every post;
+# otherwise only posts carrying one of its tags. Threads that already exist keep receiving
+# updates even if the post's tags change.
+
+def match_sql(forum_column: str, post_column: str) -> str:
+    # SQL condition: the post in post_column should be delivered to the forum in forum_column
+    return f"""(
+        NOT EXISTS (SELECT 1 FROM forum_subscriptions s WHERE s.forum_channel_id = {forum_column})
+        OR EXISTS (
+            SELECT 1 FROM forum_subscriptions s
+            JOIN tags t ON t.tag_name = s.tag_name
+            JOIN post_tags pt ON pt.tag_id = t.tag_id
+            WHERE s.forum_channel_id = {forum_column} AND pt.post_id = {post_column}
+        )
+        OR EXISTS (
+            SELECT 1 FROM forum_posted fp
+            WHERE fp.forum_channel_id = {forum_column} AND fp.post_id = {post_column}
+        )
+    )"""
+
+def get_tags(cursor, forum_channel_id: int) -> List[str]:
+    cursor.execute("SELECT tag_name FROM forum_subscriptions WHERE forum_channel_id = ? ORDER BY tag_name", (forum_channel_id,))
+    return [r[0] for r in cursor.fetchall()]
+
+def tag_exists(cursor, tag_name: str) -> bool:
+    cursor.execute("SELECT 1 FROM tags WHERE tag_name = ?", (tag_name,))
+    return cursor.fetchone() is not None
+
+def search_tags(cursor, current: str, limit: int = 25) -> List[str]:
+    # Tag names containing `current`, for slash command autocomplete (Discord shows at most 25)
+    cursor.execute("SELECT tag_name FROM tags WHERE tag_name LIKE ? ORDER BY tag_name LIMIT ?", (f"%{current}%", limit))
+    return [r[0] for r in cursor.fetchall()]
+
+def prune_repost(cursor, forum_channel_id: int) -> int:
+    # Drop new posts queued for the forum that it no longer subscribes to
+    cursor.execute(f"""
+        DELETE FROM repost
+        WHERE forum_channel_id = ? AND NOT {match_sql("repost.forum_channel_id", "repost.post_id")}
+    """, (forum_channel_id,))
+    return max(cursor.rowcount, 0)
+
+def subscribe(cursor, forum_channel_id: int, tag_name: str) -> int:
+    cursor.execute("INSERT OR IGNORE INTO forum_subscriptions (forum_channel_id, tag_name) VALUES (?, ?)",
+                   (forum_channel_id, tag_name))
+    return prune_repost(cursor, forum_channel_id)
+
+def unsubscribe(cursor, forum_channel_id: int, tag_name: str) -> int:
+    cursor.execute("DELETE FROM forum_subscriptions WHERE forum_channel_id = ? AND tag_name = ?",
+                   (forum_channel_id, tag_name))
+    return prune_repost(cursor, forum_channel_id)
+
+def clear(cursor, forum_channel_ids: List[int]) -> None:
+    cursor.execute("DELETE FROM forum_subscriptions WHERE forum_channel_id IN (SELECT value FROM json_each(?))",
+                   (json.dumps(list(forum_channel_ids)),))
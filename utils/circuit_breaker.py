@@ -0,0 +1,140 @@
+import logging
+import threading
+import time
+
+from urllib.parse import urlsplit
+
+import utils.metrics_util as metrics
+
+from config.config import (
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_RESET_SECONDS,
+    CIRCUIT_MAX_RESET_SECONDS,
+    CIRCUIT_SLOW_SECONDS,
+)
+
+log = logging.getLogger(__name__)
+
+# Circuit breaker per host and scope ("site" for the WordPress API, "attachment" for file
+# downloads, so slow posters cannot open the scraper's circuit). After
+# CIRCUIT_FAILURE_THRESHOLD consecutive failures (errors, 5xx/429, or responses slower than
+# CIRCUIT_SLOW_SECONDS) the host is skipped until the reset delay has passed; then a single probe request decides whether to close the circuit
+# again or to keep it open with a doubled delay. A probe whose caller never reports back
+# (cancelled, unexpected error) expires after the reset delay.
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+_LATENCY_ALPHA = 0.2
+
+class CircuitOpenError(Exception):
+    def __init__(self, host: str, retry_in: float):
+        super().__init__(f"Circuit for {host} is open, retry in {retry_in:.0f}s")
+        self.host = host
+        self.retry_in = retry_in
+
+class CircuitBreaker:
+    def __init__(self, host: str, scope: str = "site", failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 reset_seconds: float = CIRCUIT_RESET_SECONDS, max_reset_seconds: float = CIRCUIT_MAX_RESET_SECONDS,
+                 slow_seconds: float = CIRCUIT_SLOW_SECONDS):
+        self.host = host
+        self.scope = scope
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.max_reset_seconds = max_reset_seconds
+        self.slow_seconds = slow_seconds
+
+        self.state = CLOSED
+        self.failures = 0
+        self.latency: float | None = None
+        self._delay = reset_seconds
+        self._opened_at = 0.0
+        self._probing = False
+        self._probe_started = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        # True if a request may be sent now; in half-open state only one probe at a time
+        with self._lock:
+            if self.state == OPEN and self.retry_in() <= 0:
+                self._set_state(HALF_OPEN)
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and (not self._probing or self._probe_expired()):
+                self._probing = True
+                self._probe_started = time.monotonic()
+                return True
+            return False
+
+    def release(self) -> None:
+        # The request ended without an outcome (e.g. cancelled): free the probe slot only
+        with self._lock:
+            self._probing = False
+
+    def _probe_expired(self) -> bool:
+        return time.monotonic() - self._probe_started > self.reset_seconds
+
+    def retry_in(self) -> float:
+        if self.state == HALF_OPEN:
+            return max(0.0, self._probe_started + self.reset_seconds - time.monotonic())
+        return max(0.0, self._opened_at + self._delay - time.monotonic())
+
+    def check(self) -> None:
+        if not self.allow():
+            raise CircuitOpenError(self.host, self.retry_in())
+
+    def record_success(self, latency: float) -> None:
+        if latency > self.slow_seconds:
+            ## A host that answers this slowly blocks the crawl as much as one that times out
+            self.record_failure(latency, reason=f"slow response ({latency:.1f}s)")
+            return
+        with self._lock:
+            self._track_latency(latency)
+            self.failures = 0
+            self._probing = False
+            if self.state != CLOSED:
+                log.info(f"Circuit for {self.host} ({self.scope}) closed, host is healthy again.")
+                self._delay = self.reset_seconds
+                self._set_state(CLOSED)
+
+    def record_failure(self, latency: float | None = None, reason: str = "") -> None:
+        with self._lock:
+            if latency is not None:
+                self._track_latency(latency)
+            self.failures += 1
+            self._probing = False
+            if self.state == HALF_OPEN:
+                ## Failed probe: back off further
+                self._delay = min(self._delay * 2, self.max_reset_seconds)
+                self._open(reason)
+            elif self.state == CLOSED and self.failures >= self.failure_threshold:
+                self._open(reason)
+
+    def _open(self, reason: str) -> None:
+        self._opened_at = time.monotonic()
+        self._set_state(OPEN)
+        log.warning(f"Circuit for {self.host} ({self.scope}) opened after {self.failures} failures ({reason or 'error'}), "
+                    f"retry in {self._delay:.0f}s.")
+
+    def _set_state(self, state: str) -> None:
+        self.state = state
+        metrics.CIRCUIT_STATE.set(_STATE_VALUES[state], host=self.host, scope=self.scope)
+
+    def _track_latency(self, latency: float) -> None:
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += _LATENCY_ALPHA * (latency - self.latency)
+        metrics.HOST_LATENCY.set(round(self.latency, 4), host=self.host, scope=self.scope)
+
+_breakers: dict[tuple[str, str], CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+def get(url: str, scope: str = "site") -> CircuitBreaker:
+    key = (scope, urlsplit(url).netloc or url)
+    with _breakers_lock:
+        if key not in _breakers:
+            _breakers[key] = CircuitBreaker(key[1], scope)
+        return _breakers[key]
@@ -0,0 +1,187 @@
+import logging
+import re
+import sqlite3
+import struct
+import zlib
+
+from collections import Counter
+from config.config import CONTENT_COMPRESSION
+
+
+log = logging.getLogger(__name__)
+
+# Compressed content = header (magic + dictionary id) + raw deflate stream
+_HEADER = struct.Struct(">cH")
+_MAGIC = b"z"
+_NO_DICT = 0
+
+# zlib can only reference the last 32 KiB of the preset dictionary
+DICT_MAX_SIZE = 32 * 1024
+DICT_SAMPLE_POSTS = 2000
+DICT_MIN_POSTS = 50
+DICT_MIN_LINE_LENGTH = 4
+
+# bot_state key holding the format of the last full migrate_content pass
+CONTENT_FORMAT_KEY = "content_format"
+
+# dict_id -> dictionary bytes, shared by every connection in this process
+_dicts: dict[int, bytes] = {}
+_current_dict_id = _NO_DICT
+
+def load_dicts(conn: sqlite3.Connection) -> None:
+    global _current_dict_id
+    for dict_id, data in conn.execute("SELECT dict_id, data FROM content_dicts"):
+        _dicts[dict_id] = bytes(data)
+    if _dicts:
+        _current_dict_id = max(_dicts)
+
+def encode_content(content: str | None) -> str | bytes | None:
+    if content is None or CONTENT_COMPRESSION is None:
+        return content
+
+    raw = content.encode("utf-8")
+    zdict = _dicts.get(_current_dict_id)
+    if zdict:
+        compressor = zlib.compressobj(9, zlib.DEFLATED, -15, zdict=zdict)
+    else:
+        compressor = zlib.compressobj(9, zlib.DEFLATED, -15)
+    compressed = compressor.compress(raw) + compressor.flush()
+
+    ## Short posts may not shrink at all, keep them as plain text
+    if len(compressed) + _HEADER.size >= len(raw):
+        return content
+    return _HEADER.pack(_MAGIC, _current_dict_id if zdict else _NO_DICT) + compressed
+
+def decode_content(value: str | bytes | None) -> str | None:
+    if value is None or isinstance(value, str):
+        return value
+
+    magic, dict_id = _HEADER.unpack_from(value)
+    if magic != _MAGIC:
+        raise ValueError(f"Unknown content encoding: {magic!r}")
+    if dict_id == _NO_DICT:
+        decompressor = zlib.decompressobj(-15)
+    else:
+        decompressor = zlib.decompressobj(-15, zdict=_dicts[dict_id])
+    return (decompressor.decompress(value[_HEADER.size:]) + decompressor.flush()).decode("utf-8")
+
+# Han, kana and hangul runs; bigram_text splits them into overlapping 2-character tokens
+_CJK_RUN = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af]+")
+
+def is_cjk(text: str) -> bool:
+    # Only pure CJK terms match the bigram index like a substring search would
+    return _CJK_RUN.fullmatch(text) is not None
+
+def bigram_text(text: str | None) -> str | None:
+    # "資訊工程" -> " 資訊 訊工 工程 ", for the unicode61 bigram index (2-character CJK words)
+    if text is None:
+        return None
+    parts = []
+    pos = 0
+    for m in _CJK_RUN.finditer(text):
+        run = m.group()
+        parts.append(text[pos:m.start()])
+        parts.append(" " + (" ".join(run[i:i + 2] for i in range(len(run) - 1)) if len(run) > 1 else run) + " ")
+        pos = m.end()
+    parts.append(text[pos:])
+    return "".join(parts)
+
+def content_sql(alias: str) -> str:
+    # posted_news.content, or the body moved to posted_news_archive by retention
+    return (f"COALESCE({alias}.content, "
+            f"(SELECT a.content FROM posted_news_archive a WHERE a.post_id = {alias}.post_id))")
+
+def register(conn: sqlite3.Connection) -> None:
+    # news_content() is used by the FTS triggers and the posted_news_text view
+    conn.create_function("news_content", 1, decode_content, deterministic=True)
+    conn.create_function("news_bigrams", 1, bigram_text, deterministic=True)
+    load_dicts(conn)
+
+def train_dict(conn: sqlite3.Connection) -> int | None:
+    # Lines shared by many posts (signatures, office hours, contact info...)
+    line_counts: Counter[str] = Counter()
+    rows = conn.execute(
+        "SELECT content FROM posted_news WHERE content IS NOT NULL ORDER BY timestamp DESC LIMIT ?",
+        (DICT_SAMPLE_POSTS,),
+    ).fetchall()
+    if len(rows) < DICT_MIN_POSTS:
+        log.debug(f"Not enough posts to train a content dictionary ({len(rows)}/{DICT_MIN_POSTS}).")
+        return None
+
+    for (value,) in rows:
+        lines = {line.strip() for line in (decode_content(value) or "").splitlines()}
+        line_counts.update(line for line in lines if len(line) >= DICT_MIN_LINE_LENGTH)
+
+    min_count = max(2, len(rows) // 100)
+    common = [line for line, count in line_counts.most_common() if count >= min_count]
+    if not common:
+        return None
+
+    ## Most frequent lines go last, deflate reaches them with the shortest distances
+    data = b""
+    for line in common:
+        encoded = line.encode("utf-8") + b"\n"
+        if len(data) + len(encoded) > DICT_MAX_SIZE:
+            break
+        data = encoded + data
+
+    cursor = conn.execute("INSERT INTO content_dicts (data) VALUES (?)", (data,))
+    dict_id = cursor.lastrowid
+    load_dicts(conn)
+    log.info(f"Trained content dictionary {dict_id} ({len(data)} bytes, {len(common)} common lines).")
+    return dict_id
+
+def content_format() -> str:
+    # Storage format new rows are written in: the setting and, when compressing, the dictionary
+    if CONTENT_COMPRESSION is None:
+        return "plain"
+    return f"{CONTENT_COMPRESSION}:{_current_dict_id}"
+
+def migrate_content(conn: sqlite3.Connection, batch_size: int = 500, force: bool = False) -> int:
+    # Re-encode rows stored in the other format (plain text <-> compressed, or an old dictionary)
+    if CONTENT_COMPRESSION is None:
+        where = "typeof(content) = 'blob'"
+    else:
+        if not _dicts:
+            train_dict(conn)
+        where = "typeof(content) = 'text'"
+        if _current_dict_id != _NO_DICT:
+            ## Also blobs compressed with no or an older dictionary, e.g. the first crawl of a
+            ## new deployment, stored before there were enough posts to train one
+            where = f"({where} OR (typeof(content) = 'blob' AND substr(content, 2, 2) != X'{_current_dict_id:04X}'))"
+
+    ## Every write goes through encode_content, so after a full pass only a new format needs
+    ## another one. Without this, short posts that never shrink were re-tried on every start
+    fmt = content_format()
+    row = conn.execute("SELECT value FROM bot_state WHERE key = ?", (CONTENT_FORMAT_KEY,)).fetchone()
+    if not force and row is not None and row[0] == fmt:
+        return 0
+
+    migrated = 0
+    last_id = -1
+    while True:
+        rows = conn.execute(
+            f"SELECT post_id, content FROM posted_news WHERE {where} AND post_id > ? ORDER BY post_id LIMIT ?",
+            (last_id, batch_size),
+        ).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        updates = []
+        for post_id, value in rows:
+            new_value = encode_content(decode_content(value))
+            if new_value != value:
+                updates.append((new_value, post_id))
+        if updates:
+            conn.executemany("UPDATE posted_news SET content = ? WHERE post_id = ?", updates)
+            migrated += len(updates)
+
+    conn.execute("""
+        INSERT INTO bot_state (key, value) VALUES (?, ?)
+        ON CONFLICT(key) DO UPDATE SET value = excluded.value
+    """, (CONTENT_FORMAT_KEY, fmt))
+
+    if migrated:
+        log.info(f"Migrated {migrated} posted_news rows to {CONTENT_COMPRESSION or 'plain text'} content.")
+    return migrated
@@ -2,11 +2,65 @@ import logging
 import sqlite3
 import os
 
+from contextlib import closing
+
+import utils.content_util as cu
+
 from config.config import DB_PATH
 
 
 log = logging.getLogger(__name__)
-    
+
+# Seconds init_db waits for another process's migration (dictionary training, one-time VACUUM)
+INIT_DB_TIMEOUT = 300
+
+def connect(timeout: float = 10) -> sqlite3.Connection:
+    # Every connection that touches posted_news needs news_content() for the FTS triggers
+    conn = sqlite3.connect(DB_PATH, timeout=timeout)
+    conn.execute("PRAGMA journal_mode=WAL;")
+    conn.execute("PRAGMA foreign_keys = ON;")
+    cu.register(conn)
+    return conn
+
+def add_column(cursor: sqlite3.Cursor, table: str, column: str, decl: str) -> bool:
+    # CREATE TABLE IF NOT EXISTS does not touch existing tables, so new columns are added here
+    cursor.execute(f"PRAGMA table_info({table})")
+    if column in {row[1] for row in cursor.fetchall()}:
+        return False
+    cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+    log.info(f"Added column \033[1m{table}.{column}\033[0m.")
+    return True
+
+FTS_TRIGGERS = ("posted_news_fts_ai", "posted_news_fts_ad", "posted_news_fts_au")
+
+def drop_fts_triggers(cursor: sqlite3.Cursor) -> None:
+    for trigger in FTS_TRIGGERS:
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+
+def create_fts_triggers(cursor: sqlite3.Cursor) -> None:
+    # Keep posted_news_fts (trigram) and posted_news_bigram in sync with posted_news row by row;
+    # archived bodies stay indexed
+    drop_fts_triggers(cursor)
+    new_content, old_content = f"news_content({cu.content_sql('new')})", f"news_content({cu.content_sql('old')})"
+    insert_new = f"""
+            INSERT INTO posted_news_fts (rowid, title, content)
+            VALUES (new.post_id, new.title, {new_content});
+            INSERT INTO posted_news_bigram (rowid, title, content)
+            VALUES (new.post_id, news_bigrams(new.title), news_bigrams({new_content}));"""
+    delete_old = f"""
+            INSERT INTO posted_news_fts (posted_news_fts, rowid, title, content)
+            VALUES ('delete', old.post_id, old.title, {old_content});
+            INSERT INTO posted_news_bigram (posted_news_bigram, rowid, title, content)
+            VALUES ('delete', old.post_id, news_bigrams(old.title), news_bigrams({old_content}));"""
+    cursor.execute(f"CREATE TRIGGER posted_news_fts_ai AFTER INSERT ON posted_news BEGIN {insert_new}\n        END")
+    cursor.execute(f"CREATE TRIGGER posted_news_fts_ad AFTER DELETE ON posted_news BEGIN {delete_old}\n        END")
+    cursor.execute(f"CREATE TRIGGER posted_news_fts_au AFTER UPDATE ON posted_news BEGIN {delete_old}{insert_new}\n        END")
+
+def rebuild_fts(cursor: sqlite3.Cursor) -> None:
+    # Re-read every post into both search indexes (after bulk loads without triggers)
+    cursor.execute("INSERT INTO posted_news_fts (posted_news_fts) VALUES ('rebuild')")
+    cursor.execute("INSERT INTO posted_news_bigram (posted_news_bigram) VALUES ('rebuild')")
+
 def init_db():
     # Create data directory if not exists
     log.info("Initializing database...")
@@ -15,17 +69,27 @@ def init_db():
         os.makedirs(data_dir, exist_ok=True)
     
     # 0) Initialize database
-    conn = sqlite3.connect(DB_PATH)
+    ## The bot and scraper containers start together: the second one waits for the
+    ## first one's migration instead of failing with "database is locked"
+    conn = sqlite3.connect(DB_PATH, timeout=INIT_DB_TIMEOUT)
     conn.execute("PRAGMA foreign_keys = ON;")
+    conn.create_function("news_content", 1, cu.decode_content, deterministic=True)
+    conn.create_function("news_bigrams", 1, cu.bigram_text, deterministic=True)
     cursor = conn.cursor()
 
+    ## Apply the whole schema in one transaction: one fsync instead of one per table
+    ## IMMEDIATE takes the write lock up front, so the busy timeout applies to it
+    cursor.execute("BEGIN IMMEDIATE")
+
     # 1) registered_forum
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS registered_forum (
-            channel_id INTEGER PRIMARY KEY
+            channel_id INTEGER PRIMARY KEY,
+            guild_id INTEGER
         )
     """)
-    conn.commit()
+    ## Forums registered before sharding support have guild_id NULL until the scheduler fills it in
+    add_column(cursor, "registered_forum", "guild_id", "INTEGER")
     log.debug("Created table\033[1m registered_forum\033[0m.")
     
     # 2) posted_news
@@ -39,7 +103,6 @@ def init_db():
             timestamp DATETIME
         )
     """)
-    conn.commit()
     log.debug("Created table \033[1mposted_news\033[0m.")
 
     # 3) tags
@@ -49,7 +112,6 @@ def init_db():
             tag_name TEXT UNIQUE NOT NULL
         )
     """)
-    conn.commit()
     log.debug("Created table \033[1mtags\033[0m.")
 
     # 4) post_tags
@@ -62,7 +124,6 @@ def init_db():
             FOREIGN KEY (tag_id) REFERENCES tags(tag_id)
         )
     """)
-    conn.commit()
     log.debug("Created table \033[1mpost_tags\033[0m.")
 
     # 5) files
@@ -74,7 +135,6 @@ def init_db():
             FOREIGN KEY (post_id) REFERENCES posted_news(post_id)
         )
     """)
-    conn.commit()
     log.debug("Created table \033[1mfiles\033[0m.")
 
     # 6) images
@@ -86,7 +146,6 @@ def init_db():
             FOREIGN KEY (post_id) REFERENCES posted_news(post_id)
         )
     """)
-    conn.commit()
     log.debug("Created table \033[1mimages\033[0m.")
 
     # 7) forum_posted
@@ -99,7 +158,6 @@ def init_db():
             FOREIGN KEY (post_id) REFERENCES posted_news(post_id)
         )
     """)
-    conn.commit()
     log.debug("Created table \033[1mforum_posted\033[0m.")
 
     # 8) repost
@@ -107,13 +165,191 @@ def init_db():
         CREATE TABLE IF NOT EXISTS repost (
             forum_channel_id INTEGER,
             post_id INTEGER,
+            source TEXT NOT NULL DEFAULT 'live',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            retry_at DATETIME,
             PRIMARY KEY (forum_channel_id, post_id),
             FOREIGN KEY (post_id) REFERENCES posted_news(post_id)
         )
     """)
-    conn.commit()
+    ## source: 'live' (scraped news) or 'backfill'; attempts / retry_at: backoff after failed deliveries
+    add_column(cursor, "repost", "source", "TEXT NOT NULL DEFAULT 'live'")
+    add_column(cursor, "repost", "attempts", "INTEGER NOT NULL DEFAULT 0")
+    add_column(cursor, "repost", "retry_at", "DATETIME")
     log.debug("Created table \033[1mrepost\033[0m.")
 
+    # 9) content_dicts (shared compression dictionaries for posted_news.content)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS content_dicts (
+            dict_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            data BLOB NOT NULL
+        )
+    """)
+    cu.load_dicts(conn)
+    log.debug("Created table \033[1mcontent_dicts\033[0m.")
+
+    # 9.5) posted_news_archive (content of old posts, moved out of posted_news by retention)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS posted_news_archive (
+            post_id INTEGER PRIMARY KEY,
+            content TEXT,
+            FOREIGN KEY (post_id) REFERENCES posted_news(post_id)
+        )
+    """)
+    log.debug("Created table \033[1mposted_news_archive\033[0m.")
+
+    # 10) posted_news_text (posted_news with decoded content)
+    cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'view' AND name = 'posted_news_text'")
+    row = cursor.fetchone()
+    if row is not None and "posted_news_archive" not in row[0]:
+        ## Older view did not see archived content
+        cursor.execute("DROP VIEW posted_news_text")
+    cursor.execute(f"""
+        CREATE VIEW IF NOT EXISTS posted_news_text AS
+        SELECT p.post_id, p.title, news_content({cu.content_sql("p")}) AS content FROM posted_news p
+    """)
+    log.debug("Created view \033[1mposted_news_text\033[0m.")
+
+    # 11) posted_news_fts (full-text index over posted_news_text, trigram for CJK)
+    cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'posted_news_fts'")
+    row = cursor.fetchone()
+    fts_exists = row is not None and "posted_news_text" in row[0]
+    if row is not None and not fts_exists:
+        ## Older index read posted_news directly and cannot see compressed content
+        cursor.execute("DROP TABLE posted_news_fts")
+    cursor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS posted_news_fts USING fts5(
+            title,
+            content,
+            content='posted_news_text',
+            content_rowid='post_id',
+            tokenize='trigram'
+        )
+    """)
+    if not fts_exists:
+        ## Index the news archived before the FTS table existed
+        cursor.execute("INSERT INTO posted_news_fts (posted_news_fts) VALUES ('rebuild')")
+    log.debug("Created table \033[1mposted_news_fts\033[0m.")
+
+    # 11.5) posted_news_bigram (unicode61 index over CJK bigrams, for 2-character words)
+    cursor.execute("""
+        CREATE VIEW IF NOT EXISTS posted_news_bigram_text AS
+        SELECT post_id, news_bigrams(title) AS title, news_bigrams(content) AS content FROM posted_news_text
+    """)
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'posted_news_bigram'")
+    bigram_exists = cursor.fetchone() is not None
+    cursor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS posted_news_bigram USING fts5(
+            title,
+            content,
+            content='posted_news_bigram_text',
+            content_rowid='post_id',
+            tokenize='unicode61'
+        )
+    """)
+    if not bigram_exists:
+        cursor.execute("INSERT INTO posted_news_bigram (posted_news_bigram) VALUES ('rebuild')")
+    create_fts_triggers(cursor)
+    log.debug("Created table \033[1mposted_news_bigram\033[0m.")
+
+    # 12) posted_news_history (previous version of updated posts)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS posted_news_history (
+            post_id INTEGER PRIMARY KEY,
+            content TEXT,
+            attachments_changed INTEGER DEFAULT 0,
+            FOREIGN KEY (post_id) REFERENCES posted_news(post_id)
+        )
+    """)
+    log.debug("Created table \033[1mposted_news_history\033[0m.")
+
+    # 13) bot_state (key-value store, e.g. hash of the last synced command tree)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS bot_state (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    """)
+    log.debug("Created table \033[1mbot_state\033[0m.")
+
+    # 14) rendered_posts (Discord title/body/attachment manifest, rendered at ingest)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS rendered_posts (
+            post_id INTEGER PRIMARY KEY,
+            content_hash TEXT,
+            title TEXT,
+            body TEXT,
+            manifest TEXT,
+            FOREIGN KEY (post_id) REFERENCES posted_news(post_id)
+        )
+    """)
+    log.debug("Created table \033[1mrendered_posts\033[0m.")
+
+    # 15) backfill_jobs (historical backfill requested by /backfill or add_forum)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS backfill_jobs (
+            job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            forum_channel_id INTEGER NOT NULL,
+            since TEXT,
+            until TEXT,
+            tag_name TEXT,
+            status TEXT NOT NULL DEFAULT 'pending',
+            total INTEGER NOT NULL DEFAULT 0,
+            done INTEGER NOT NULL DEFAULT 0,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    log.debug("Created table \033[1mbackfill_jobs\033[0m.")
+
+    # 16) backfill_queue (posts of a job not yet moved into repost)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS backfill_queue (
+            job_id INTEGER,
+            post_id INTEGER,
+            PRIMARY KEY (job_id, post_id),
+            FOREIGN KEY (job_id) REFERENCES backfill_jobs(job_id),
+            FOREIGN KEY (post_id) REFERENCES posted_news(post_id)
+        )
+    """)
+    log.debug("Created table \033[1mbackfill_queue\033[0m.")
+
+    # 17) forum_subscriptions (tags a forum wants; no rows = every post)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS forum_subscriptions (
+            forum_channel_id INTEGER,
+            tag_name TEXT,
+            PRIMARY KEY (forum_channel_id, tag_name)
+        )
+    """)
+    log.debug("Created table \033[1mforum_subscriptions\033[0m.")
+
+    # 18) Migrate content to the configured storage format
+    cu.migrate_content(conn)
+    conn.commit()
+
+    # 19) Incremental auto_vacuum, so retention can give freed pages back to the filesystem
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        ## An existing database only switches mode with a full VACUUM, done once here
+        log.info("Switching database to auto_vacuum=INCREMENTAL (one-time VACUUM)...")
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        try:
+            conn.execute("VACUUM")
+        except sqlite3.OperationalError as e:
+            log.warning(f"VACUUM failed, retrying on next start: {e}")
+
     log.info("Database initialized.")
     
-    conn.close()
\ No newline at end of file
+    conn.close()
+
+def get_state(key: str) -> str | None:
+    with closing(connect()) as conn:
+        row = conn.execute("SELECT value FROM bot_state WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+def set_state(key: str, value: str) -> None:
+    with closing(connect()) as conn:
+        conn.execute("""
+            INSERT INTO bot_state (key, value) VALUES (?, ?)
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value
+        """, (key, value))
+        conn.commit()
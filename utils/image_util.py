@@ -0,0 +1,143 @@
+import asyncio
+import hashlib
+import importlib.util
+import io
+import logging
+import os
+import time
+
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from config.config import (
+    IMAGE_PROCESSING,
+    IMAGE_POOL,
+    IMAGE_WORKERS,
+    IMAGE_MAX_DIMENSION,
+    IMAGE_JPEG_QUALITY,
+    IMAGE_MIN_BYTES,
+    IMAGE_CACHE_DIR,
+)
+
+log = logging.getLogger(__name__)
+
+# Optional dependency: without Pillow (uv sync --extra images) images are uploaded as-is
+HAS_PIL = importlib.util.find_spec("PIL") is not None
+
+SUPPORTED_FORMATS = {"JPEG", "PNG"}
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+_SKIP_SUFFIX = ".skip"
+
+_executor: Executor | None = None
+
+def enabled() -> bool:
+    return IMAGE_PROCESSING and HAS_PIL
+
+def is_image_url(url: str) -> bool:
+    # Posters are often attached as files rather than embedded
+    return url.split("?")[0].lower().endswith(IMAGE_EXTENSIONS)
+
+def _get_executor() -> Executor:
+    global _executor
+    if _executor is None:
+        if IMAGE_POOL == "process":
+            _executor = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+        else:
+            ## Pillow releases the GIL while decoding, resizing and encoding
+            _executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="image")
+    return _executor
+
+def shutdown() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+def shrink_image(data: bytes, max_dimension: int, jpeg_quality: int) -> tuple[bytes, str] | None:
+    # Runs in the pool. Returns (bytes, extension) when the result is smaller, else None
+    from PIL import Image
+
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            if img.format not in SUPPORTED_FORMATS:
+                return None
+            img.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+
+            out = io.BytesIO()
+            has_alpha = img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+            if has_alpha:
+                ## Transparent posters stay PNG
+                img.save(out, format="PNG", optimize=True)
+                ext = ".png"
+            else:
+                img.convert("RGB").save(out, format="JPEG", quality=jpeg_quality, optimize=True, progressive=True)
+                ext = ".jpg"
+    except Exception as e:
+        log.debug(f"Cannot process image: {e}")
+        return None
+
+    result = out.getvalue()
+    return (result, ext) if len(result) < len(data) else None
+
+def _cache_path(key: str) -> str:
+    return os.path.join(IMAGE_CACHE_DIR, key[:2], key)
+
+def _cache_get(key: str) -> tuple[bytes, str] | None | bool:
+    # (bytes, ext) for a cached result, False for a cached "keep original", None when unknown
+    base = _cache_path(key)
+    if os.path.exists(base + _SKIP_SUFFIX):
+        os.utime(base + _SKIP_SUFFIX)
+        return False
+    for ext in (".jpg", ".png"):
+        if os.path.exists(base + ext):
+            ## mtime doubles as last use, for prune_cache
+            os.utime(base + ext)
+            with open(base + ext, "rb") as f:
+                return f.read(), ext
+    return None
+
+def _cache_put(key: str, result: tuple[bytes, str] | None) -> None:
+    base = _cache_path(key)
+    try:
+        os.makedirs(os.path.dirname(base), exist_ok=True)
+        data, ext = result if result else (b"", _SKIP_SUFFIX)
+        tmp = f"{base}{ext}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, base + ext)
+    except OSError as e:
+        log.warning(f"Cannot write image cache: {e}")
+
+def prune_cache(max_age_days: int) -> int:
+    # Delete cached results not used for max_age_days
+    cutoff = time.time() - max_age_days * 86400
+    removed = 0
+    for root, _, files in os.walk(IMAGE_CACHE_DIR):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except OSError as e:
+                log.debug(f"Cannot prune {path}: {e}")
+    return removed
+
+async def process(data: bytes, filename: str) -> tuple[bytes, str]:
+    # Downscale and recompress large JPEG/PNG images; the same poster is usually sent to
+    # every forum, so results are cached on disk by content hash and settings
+    if not enabled() or len(data) < IMAGE_MIN_BYTES:
+        return data, filename
+
+    key = hashlib.sha256(data).hexdigest() + f"-{IMAGE_MAX_DIMENSION}-{IMAGE_JPEG_QUALITY}"
+    cached = await asyncio.to_thread(_cache_get, key)
+    if cached is None:
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(_get_executor(), shrink_image, data, IMAGE_MAX_DIMENSION, IMAGE_JPEG_QUALITY)
+        await asyncio.to_thread(_cache_put, key, result)
+    else:
+        result = cached or None
+
+    if result is None:
+        return data, filename
+    new_data, ext = result
+    log.debug(f"Shrunk {filename} from {len(data) / 1024:.0f} KiB to {len(new_data) / 1024:.0f} KiB")
+    return new_data, os.path.splitext(filename)[0] + ext
@@ -1,8 +1,18 @@
 from __future__ import annotations
 
+import atexit
+import copy
+import json
 import logging
+import queue
 import sys
-from logging.handlers import TimedRotatingFileHandler
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+
+from config.config import LOG_DEBUG_SAMPLING
+
+_listener: QueueListener | None = None
+
 class ColorFormatter(logging.Formatter):
     COLORS = {
         logging.DEBUG: "\033[1;90m",     # 灰
@@ -27,7 +37,65 @@ class ColorFormatter(logging.Formatter):
             # 還原，避免影響 file handler 或其他 formatter
             record.levelname = original_levelname
 
-def setup_logging(console_level: int = logging.INFO) -> None:
+class JsonFormatter(logging.Formatter):
+    # 一行一個 JSON 物件，方便送進 Loki / Elasticsearch 等收集工具
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "file": f"{record.filename}:{record.lineno}",
+            "thread": record.threadName,
+        }
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False)
+
+class ExcInfoQueueHandler(QueueHandler):
+    # 預設的 prepare 會把 traceback 併進 message 並清掉 exc_info，JsonFormatter 就寫不出 "exc"；
+    # 這裡只先算好 message，例外留給 listener 端的 formatter 處理
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        return record
+
+class SamplingFilter(logging.Filter):
+    # 對吵雜模組的 DEBUG 記錄每 N 筆只保留 1 筆；INFO 以上不受影響
+    def __init__(self, rates: dict[str, int]):
+        super().__init__()
+        self.rates = rates
+        self.counts: dict[str, int] = {}
+
+    def _rate(self, name: str) -> int:
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition(".")[0]
+        return 1
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+        rate = self._rate(record.name)
+        if rate <= 1:
+            return True
+        count = self.counts.get(record.name, 0)
+        self.counts[record.name] = count + 1
+        return count % rate == 0
+
+def stop_logging() -> None:
+    # 送出佇列中剩餘的記錄
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def setup_logging(console_level: int = logging.INFO, filename: str = "logs/app.log", json_format: bool = False) -> None:
+    global _listener
+
     # 1) root logger = 你全專案共用的 logger
     root = logging.getLogger()
     root.setLevel(logging.DEBUG)
@@ -39,28 +107,37 @@ def setup_logging(console_level: int = logging.INFO) -> None:
     # 2) console handler（直觀）
     console = logging.StreamHandler(sys.stdout)
     console.setLevel(console_level)
-    console.setFormatter(ColorFormatter(
+    console.setFormatter(JsonFormatter() if json_format else ColorFormatter(
         "%(asctime)s | %(levelname)s | %(name)s | %(message)s",
         datefmt="%H:%M:%S",
     ))
 
     # 3) file handler（完整，按天切檔）
     file_handler = TimedRotatingFileHandler(
-        filename="logs/app.log",
+        filename=filename,
         when="midnight",
         backupCount=14,
         encoding="utf-8",
         utc=False,
     )
     file_handler.setLevel(logging.DEBUG)
-    file_handler.setFormatter(logging.Formatter(
+    file_handler.setFormatter(JsonFormatter() if json_format else logging.Formatter(
         "%(asctime)s | %(levelname)s | %(name)s | %(filename)s:%(lineno)d | %(message)s",
         datefmt="%Y-%m-%d %H:%M:%S",
     ))
 
-    root.addHandler(console)
-    root.addHandler(file_handler)
+    # 4) root 只掛 QueueHandler：呼叫端（包含 event loop）只把記錄放進佇列，
+    #    格式化、寫檔與換檔都在 QueueListener 的背景執行緒進行
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = ExcInfoQueueHandler(log_queue)
+    queue_handler.setLevel(logging.DEBUG)
+    queue_handler.addFilter(SamplingFilter(LOG_DEBUG_SAMPLING))
+    root.addHandler(queue_handler)
+
+    _listener = QueueListener(log_queue, console, file_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
 
-    # 4) discord.py 自己的 logger：讓它走 root handler，但你可以降噪
+    # 5) discord.py 自己的 logger：讓它走 root handler，但你可以降噪
     logging.getLogger("discord").setLevel(logging.INFO)
     logging.getLogger("discord.http").setLevel(logging.WARNING)
\ No newline at end of file
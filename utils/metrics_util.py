@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+
+from contextlib import contextmanager
+from typing import Iterator
+
+log = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# 所有 metric 共用一把鎖：scraper 在 asyncio.to_thread 的 worker thread 中更新
+_lock = threading.Lock()
+_registry: list[_Metric] = []
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        _registry.append(self)
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> list[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {v}" for k, v in self._values.items()]
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        with _lock:
+            self._values[self._key(labels)] = value
+
+    def samples(self) -> list[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {v}" for k, v in self._values.items()]
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: tuple[float, ...] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [bucket counts..., sum, count]
+        self._values: dict[tuple[str, ...], list[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with _lock:
+            data = self._values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    data[i] += 1
+            data[-2] += value
+            data[-1] += 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> list[str]:
+        lines = []
+        for key, data in self._values.items():
+            for bound, count in zip(self.buckets, data):
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {count}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {data[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {data[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {data[-1]}")
+        return lines
+
+# Metrics
+## stage: category_fetch, page_fetch, parse, db_upsert, attachment_download, discord_create, discord_update
+STAGE_SECONDS = Histogram(
+    "news_stage_duration_seconds", "Time spent in each stage of the news pipeline.", ("stage",)
+)
+## status: CREATE, UPDATE, NO_CHANGE
+POST_STATUS = Counter(
+    "news_post_status_total", "Scraped posts by database outcome.", ("status",)
+)
+## target: csie (department website), attachment, discord (429s discord.py retried or gave up on,
+## counted from its log, plus 429s that reached our code as HTTPException)
+RATE_LIMITED = Counter(
+    "news_rate_limited_total", "HTTP 429 responses received.", ("target",)
+)
+## state: 0 closed, 1 half-open, 2 open; scope: site, attachment
+CIRCUIT_STATE = Gauge(
+    "news_circuit_state", "Circuit breaker state per host.", ("host", "scope")
+)
+HOST_LATENCY = Gauge(
+    "news_host_latency_seconds", "Moving average of response time per host.", ("host", "scope")
+)
+REPOST_QUEUE_DEPTH = Gauge(
+    "news_repost_queue_depth", "Pending rows in the repost table."
+)
+
+class DiscordRateLimitHandler(logging.Handler):
+    # discord.py sleeps and retries 429s inside its HTTP client, so they rarely reach the
+    # caller; its WARNING "We are being rate limited." is logged once per 429 it handles
+    PREFIX = "We are being rate limited."
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if record.getMessage().startswith(self.PREFIX):
+            RATE_LIMITED.inc(target="discord")
+
+def count_discord_rate_limits() -> None:
+    logger = logging.getLogger("discord.http")
+    if not any(isinstance(h, DiscordRateLimitHandler) for h in logger.handlers):
+        logger.addHandler(DiscordRateLimitHandler())
+
+def render() -> str:
+    with _lock:
+        return "\n".join(m.render() for m in _registry) + "\n"
+
+def start_metrics_thread(host: str, port: int):
+    # For the synchronous scraper process: plain http.server in a daemon thread
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    log.info(f"Metrics endpoint listening on http://{host}:{port}/metrics")
+    return server
+
+async def start_metrics_server(host: str, port: int):
+    from aiohttp import web
+
+    async def handle_metrics(request: web.Request) -> web.Response:
+        return web.Response(text=render(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    log.info(f"Metrics endpoint listening on http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,59 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import time
+import tracemalloc
+
+from datetime import datetime
+from typing import Any, Callable
+
+log = logging.getLogger(__name__)
+
+REPORT_DIR = "logs"
+TOP_FUNCTIONS = 30
+TOP_ALLOCATIONS = 15
+
+def run_profiled(func: Callable[..., Any], label: str, *args, trace_memory: bool = False, **kwargs) -> Any:
+    # Profile one call of func (one sync cycle) and write logs/profile-<label>-<time>.txt/.prof
+    # cProfile only records the calling thread; tracemalloc counts allocations of the whole process
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    base_path = os.path.join(REPORT_DIR, f"profile-{label}-{stamp}")
+
+    profiler = cProfile.Profile()
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    profiler.enable()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        profiler.disable()
+        elapsed = time.perf_counter() - start
+        if trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+
+        report = io.StringIO()
+        report.write(f"Profile of {label} at {stamp}\n")
+        report.write(f"Wall time: {elapsed:.3f}s\n\n")
+
+        ## Top functions by cumulative time
+        stats = pstats.Stats(profiler, stream=report)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(TOP_FUNCTIONS)
+
+        ## Peak memory and top allocation sites
+        if trace_memory:
+            report.write(f"Memory (whole process, all threads): current {current / 1024 / 1024:.1f} MiB, "
+                         f"peak {peak / 1024 / 1024:.1f} MiB\n")
+            report.write(f"Top {TOP_ALLOCATIONS} allocation sites:\n")
+            for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]:
+                report.write(f"  {stat}\n")
+
+        with open(f"{base_path}.txt", "w", encoding="utf-8") as f:
+            f.write(report.getvalue())
+        profiler.dump_stats(f"{base_path}.prof")
+        log.info(f"Profiled {label} in {elapsed:.2f}s, report written to {base_path}.txt")